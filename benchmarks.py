@@ -0,0 +1,333 @@
+'''
+Benchmark suite of the hot paths of every lab, with JSON results and regression checks against a baseline.
+
+    python benchmarks.py                                  # run everything, print a table
+    python benchmarks.py --out results.json               # machine readable results
+    python benchmarks.py --baseline results.json          # compare, exit status 1 on a regression
+    python benchmarks.py --only 'quixo.*' --profile prof  # cProfile dump of every benchmark in prof/
+    python benchmarks.py --tracemalloc                    # peak memory allocated by one call
+
+Every benchmark prepares its inputs once (fixed seeds), then times repeat rounds of `number` calls and
+reports the median and the best time per call. A benchmark whose dependencies are missing is skipped.
+'''
+import argparse
+import cProfile
+import fnmatch
+import json
+import os
+import platform
+import pstats
+import statistics
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for lab in ('quixo', 'lab1', 'lab2', 'lab9', 'lab10', 'halloween'):
+    sys.path.insert(0, os.path.join(ROOT, lab))
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, number: int):
+    '''
+    Registers a setup function: it returns the function to time, called without arguments, and the number
+    of operations done by one call (moves generated, genomes evaluated...) to report a throughput.
+    '''
+    def register(setup):
+        BENCHMARKS[name] = (setup, number)
+        return setup
+    return register
+
+
+def quixo_positions(n: int = 20):
+    from benchmark import random_positions
+    from enhanced_game import EnhancedGame
+    return random_positions(EnhancedGame, n=n, plies=12, seed=42)
+
+
+@benchmark('quixo.check_winner', number=200)
+def _check_winner():
+    from game import Game
+    games = []
+    for position, _ in quixo_positions():
+        game = Game()
+        game._board = position.get_board()
+        games.append(game)
+
+    def run():
+        for game in games:
+            game.check_winner()
+    return run, len(games)
+
+
+@benchmark('quixo.enhanced_move', number=5)
+def _enhanced_move():
+    children = []
+    for game, player in quixo_positions():
+        children.extend((game, tile, slide, player) for tile, slide in game.get_available_moves(player))
+    # move changes the board, each call plays on copies made beforehand
+    pool = []
+
+    def run():
+        for game, tile, slide, player in pool.pop():
+            game.move(tile, slide, player)
+
+    def refill(rounds):
+        pool.extend([(deepcopy(g), t, s, p) for g, t, s, p in children] for _ in range(rounds))
+    run.refill = refill
+    return run, len(children)
+
+
+@benchmark('quixo.get_available_moves', number=50)
+def _available_moves():
+    positions = quixo_positions()
+
+    def run():
+        for game, _ in positions:
+            game.get_available_moves(0)
+            game.get_available_moves(1)
+    return run, 2 * len(positions)
+
+
+def _minmax(depth: int):
+    from players import MinMaxFragger
+    positions = quixo_positions(5)
+    searchers = []
+
+    def run():
+        for searcher, game in searchers.pop():
+            searcher.make_move(game)
+
+    def refill(rounds):
+        # a fresh searcher per call, killers and history of earlier searches would change the tree
+        searchers.extend([(MinMaxFragger(player, depth), game) for game, player in positions] for _ in range(rounds))
+    run.refill = refill
+    return run, len(positions)
+
+
+@benchmark('quixo.minmax_depth1', number=5)
+def _minmax_depth1():
+    return _minmax(1)
+
+
+@benchmark('quixo.minmax_depth2', number=1)
+def _minmax_depth2():
+    return _minmax(2)
+
+
+def _lab9_genomes(n: int, length: int = 1000):
+    import numpy as np
+    return np.random.default_rng(42).integers(0, 2, (n, length), dtype=np.uint8)
+
+
+@benchmark('lab9.fitness', number=20)
+def _lab9_fitness():
+    import lab9_lib
+    problem = lab9_lib.make_problem(10)
+    genomes = [g.tolist() for g in _lab9_genomes(50)]
+
+    def run():
+        for genome in genomes:
+            problem(genome)
+    return run, len(genomes)
+
+
+@benchmark('lab9.evaluate_batch', number=20)
+def _lab9_batch():
+    import lab9_lib
+    problem = lab9_lib.make_problem(10)
+    population = _lab9_genomes(100)
+    return lambda: problem.evaluate_batch(population), len(population)
+
+
+def _set_cover():
+    from set_cover import random_problem
+    import numpy as np
+    problem = random_problem(5_000, 5_000, 0.001, seed=42)
+    population = np.random.default_rng(42).random((64, problem.num_sets)) < 0.5
+    return problem, population
+
+
+@benchmark('set_cover.fitness', number=20)
+def _set_cover_fitness():
+    problem, population = _set_cover()
+
+    def run():
+        for solution in population:
+            problem.fitness(solution)
+    return run, len(population)
+
+
+@benchmark('set_cover.evaluate', number=20)
+def _set_cover_evaluate():
+    problem, population = _set_cover()
+    return lambda: problem.evaluate(population), len(population)
+
+
+@benchmark('astar.problem50', number=1)
+def _astar():
+    from astar_bitmask import astar_search, problem
+    sets = problem(50)
+    return lambda: astar_search(50, sets), 1
+
+
+@benchmark('nim.optimal_game', number=20)
+def _nim():
+    import random
+    from nim_engine import optimal, play_game
+    random.seed(42)
+    return lambda: play_game((optimal, optimal), 20, 3), 1
+
+
+@benchmark('q_table.greedy', number=20)
+def _q_table():
+    import numpy as np
+    from q_table import QTable, player_states
+    table = QTable('X', symmetry=True)
+    codes = player_states('X')
+    rng = np.random.default_rng(42)
+    return lambda: table.greedy(codes, rng, codes=True), len(codes)
+
+
+def measure(run, number: int, repeat: int) -> list:
+    '''Seconds per call of repeat rounds of number calls'''
+    refill = getattr(run, 'refill', None)
+    times = []
+    for _ in range(repeat):
+        if refill:
+            refill(number)
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+
+def peak_memory(run) -> int:
+    '''Peak bytes allocated during one call, on top of what was allocated before it'''
+    if getattr(run, 'refill', None):
+        run.refill(1)
+    tracemalloc.start()
+    try:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - current
+
+
+def profile(name: str, run, number: int, directory: str, top: int = 10) -> None:
+    '''Dumps the cProfile stats of number calls to directory/name.prof and prints the top functions'''
+    if getattr(run, 'refill', None):
+        run.refill(number)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for _ in range(number):
+        run()
+    profiler.disable()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{name}.prof')
+    profiler.dump_stats(path)
+    print(f'--- {name} ({path})', file=sys.stderr)
+    pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(top)
+
+
+def run_benchmarks(patterns=None, repeat: int = 5, scale: float = 1.0, memory: bool = False, profile_dir: str = None) -> dict:
+    '''Runs the benchmarks whose name matches one of the patterns, returns the JSON document of the results'''
+    results = {}
+    for name, (setup, number) in BENCHMARKS.items():
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        number = max(1, round(number * scale))
+        try:
+            run, operations = setup()
+        except ImportError as e:
+            results[name] = {'skipped': f'missing dependency: {e.name}'}
+            continue
+        measure(run, 1, 1)  # warm up caches and lazy tables outside of the measure
+        times = measure(run, number, repeat)
+        median = statistics.median(times)
+        result = {
+            'median_s': median,
+            'min_s': min(times),
+            'operations': operations,
+            'ops_per_s': operations / median,
+            'number': number,
+            'repeat': repeat,
+        }
+        if memory:
+            result['peak_bytes'] = peak_memory(run)
+        if profile_dir:
+            profile(name, run, number, profile_dir)
+        results[name] = result
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    '''
+    Benchmarks whose best time per call is more than tolerance slower than in the baseline, as (name, baseline,
+    current, ratio). The best of the rounds is compared, it is the least sensitive to other load on the machine.
+    '''
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name, {})
+        if 'min_s' in result and 'min_s' in base:
+            ratio = result['min_s'] / base['min_s']
+            if ratio > 1 + tolerance:
+                regressions.append((name, base['min_s'], result['min_s'], ratio))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', default=None, metavar='PATTERN', help='glob patterns of benchmark names')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    parser.add_argument('--repeat', type=int, default=5, help='timed rounds per benchmark')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies the calls per round')
+    parser.add_argument('--out', default=None, help='JSON file of the results')
+    parser.add_argument('--baseline', default=None, help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='slowdown over the baseline reported as regression')
+    parser.add_argument('--tracemalloc', action='store_true', help='also measure the peak memory of one call')
+    parser.add_argument('--profile', default=None, metavar='DIR', help='write a cProfile dump of every benchmark in DIR')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        return 0
+    report = run_benchmarks(args.only, args.repeat, args.scale, args.tracemalloc, args.profile)
+    for name, r in report['results'].items():
+        if 'skipped' in r:
+            print(f"{name:28} skipped, {r['skipped']}")
+            continue
+        memory = f"  peak {r['peak_bytes'] / 1024:9.1f} KiB" if 'peak_bytes' in r else ''
+        print(f"{name:28} {r['median_s'] * 1e3:10.3f} ms/call (min {r['min_s'] * 1e3:.3f})  {r['ops_per_s']:14,.0f} ops/s{memory}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for name, before, after, ratio in regressions:
+            print(f'REGRESSION {name}: {before * 1e3:.3f} -> {after * 1e3:.3f} ms/call (x{ratio:.2f})')
+        if regressions:
+            return 1
+        print(f'no regression over {args.tolerance:.0%} against {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
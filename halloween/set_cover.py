@@ -0,0 +1,195 @@
+'''
+Set covering problems for the Halloween challenge, sized for 5,000 - 100,000 points and sets.
+
+Every set is a row of a CSR matrix (points of the set); the packed uint64 bitmasks of num_points bits are only
+built for the callers that ask for them (masks, coverage), scoring solutions works on the CSR rows. Solutions are boolean arrays of num_sets entries, the '0'/'1' strings of
+the notebook are accepted too.
+
+    problem = SetCoverProblem(make_set_covering_problem(100, 100, 0.3))   # the notebook instance
+    problem = random_problem(20_000, 20_000, 0.001, seed=42)              # a large one
+    valid, cost = problem.fitness(solution)                               # same answer as fitness2
+    valid, cost, uncovered = problem.evaluate(population)                 # (population_size, num_sets)
+'''
+from functools import cached_property
+from itertools import product
+from random import random, randint, seed
+import numpy as np
+from scipy import sparse
+
+# bits set in every byte value, popcount of uint64 words goes through their bytes
+BYTE_POPCOUNT = np.array([bin(b).count('1') for b in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    '''Set bits in each row of a (..., n_words) uint64 array'''
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    return BYTE_POPCOUNT[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def as_bits(solution) -> np.ndarray:
+    '''Boolean array of a solution given as bools, 0/1 or a '0'/'1' string'''
+    if isinstance(solution, str):
+        return np.frombuffer(solution.encode(), dtype=np.uint8) == ord('1')
+    return np.asarray(solution) != 0
+
+
+def make_set_covering_problem(num_points, num_sets, density):
+    '''The generator of the notebook, same seed and same sets'''
+    seed(num_points * 2654435761 + num_sets + density)
+    sets = sparse.lil_matrix((num_sets, num_points), dtype=bool)
+    for s, p in product(range(num_sets), range(num_points)):
+        if random() < density:
+            sets[s, p] = True
+    for p in range(num_points):
+        sets[randint(0, num_sets - 1), p] = True
+    return sets
+
+
+def random_problem(num_points, num_sets, density, seed=None) -> 'SetCoverProblem':
+    '''
+    Same distribution as make_set_covering_problem (every point in each set with probability density, plus
+    one random set per point so a cover exists) drawn with NumPy, usable for large sparse instances.
+    '''
+    rng = np.random.default_rng(seed)
+    sizes = rng.binomial(num_points, density, num_sets)
+    rows = np.repeat(np.arange(num_sets), sizes)
+    cols = np.concatenate([rng.choice(num_points, k, replace=False) for k in sizes] + [np.empty(0, dtype=np.int64)])
+    rows = np.concatenate([rows, rng.integers(0, num_sets, num_points)])
+    cols = np.concatenate([cols, np.arange(num_points)])
+    return SetCoverProblem(sparse.csr_matrix((np.ones(len(rows), dtype=np.uint8), (rows, cols)), shape=(num_sets, num_points)))
+
+
+class SetCoverProblem:
+    '''
+    sets: (num_sets, num_points) boolean matrix, scipy sparse or dense.
+    calls counts the solutions evaluated, as fitness_counter in the notebook.
+    '''
+
+    def __init__(self, sets):
+        sets = sparse.csr_matrix(sets, dtype=np.uint8)
+        sets.sum_duplicates()
+        sets.eliminate_zeros()
+        sets.data[:] = 1
+        self.sets = sets
+        self.num_sets, self.num_points = sets.shape
+        self.calls = 0
+
+    @cached_property
+    def masks(self) -> np.ndarray:
+        '''(num_sets, n_words) packed uint64 bitmask of each set, bit p % 64 of word p // 64 is point p'''
+        masks = np.zeros((self.num_sets, -(-self.num_points // 64)), dtype=np.uint64)
+        rows = np.repeat(np.arange(self.num_sets), np.diff(self.sets.indptr))
+        cols = self.sets.indices
+        np.bitwise_or.at(masks, (rows, cols // 64), np.left_shift(np.uint64(1), (cols % 64).astype(np.uint64)))
+        return masks
+
+    @cached_property
+    def _points(self):
+        '''(num_points, num_sets) CSR matrix, the sets containing each point'''
+        return self.sets.T.tocsr()
+
+    def coverage(self, solution) -> np.ndarray:
+        '''Packed uint64 bitmask of the points covered by a solution'''
+        selected = np.flatnonzero(as_bits(solution))
+        if len(selected) == 0:
+            return np.zeros(-(-self.num_points // 64), dtype=np.uint64)
+        return np.bitwise_or.reduce(self.masks[selected], axis=0)
+
+    def fitness(self, solution) -> tuple[bool, int]:
+        '''(valid, cost) of one solution, as fitness2 in the notebook'''
+        self.calls += 1
+        bits = as_bits(solution)
+        # points of the selected rows only: O(points of the selected sets), no dense (num_sets, words) masks
+        covered = np.zeros(self.num_points, dtype=bool)
+        covered[self.sets[np.flatnonzero(bits)].indices] = True
+        return bool(covered.all()), int(bits.sum())
+
+    def evaluate(self, population, max_cells: int = 1 << 24) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        (valid, cost, uncovered points) of every solution of a (population_size, num_sets) boolean array,
+        from the product of the population with the sets. Rows are processed in blocks of at most max_cells
+        (rows * num_points) counters.
+        '''
+        if len(population) and isinstance(population[0], str):
+            population = [as_bits(solution) for solution in population]
+        population = np.atleast_2d(np.asarray(population) != 0)
+        self.calls += len(population)
+        cost = population.sum(axis=1)
+        uncovered = np.empty(len(population), dtype=np.int64)
+        step = max(1, max_cells // max(1, self.num_points))
+        for start in range(0, len(population), step):
+            block = population[start:start + step].T.astype(np.int32)
+            counts = self._points @ block  # (num_points, rows): how many selected sets cover each point
+            uncovered[start:start + step] = (counts == 0).sum(axis=0)
+        return uncovered == 0, cost, uncovered
+
+
+class CoverageTracker:
+    '''
+    Current solution of a local search with the number of selected sets covering each point. Adding or
+    removing a set costs O(|set|), validity, uncovered points and cost are kept up to date.
+
+        tracker = CoverageTracker(problem)
+        tracker.add(3); tracker.remove(7)
+        if tracker.valid and tracker.cost < best: ...
+    '''
+
+    def __init__(self, problem: SetCoverProblem, solution=None):
+        self.problem = problem
+        self._indptr = problem.sets.indptr.tolist()
+        self._indices = problem.sets.indices
+        self.selected = np.zeros(problem.num_sets, dtype=bool)
+        self.counts = np.zeros(problem.num_points, dtype=np.int32)
+        self.uncovered = problem.num_points
+        self.cost = 0
+        if solution is not None:
+            for s in np.flatnonzero(as_bits(solution)):
+                self.add(int(s))
+
+    @property
+    def valid(self) -> bool:
+        return self.uncovered == 0
+
+    def points(self, s: int) -> np.ndarray:
+        return self._indices[self._indptr[s]:self._indptr[s + 1]]
+
+    def gain(self, s: int) -> int:
+        '''Points that adding set s would cover for the first time'''
+        return int(np.count_nonzero(self.counts[self.points(s)] == 0))
+
+    def loss(self, s: int) -> int:
+        '''Points that removing set s would leave uncovered'''
+        return int(np.count_nonzero(self.counts[self.points(s)] == 1))
+
+    def add(self, s: int) -> int:
+        '''Selects set s, returns the points it newly covers'''
+        if self.selected[s]:
+            return 0
+        points = self._indices[self._indptr[s]:self._indptr[s + 1]]
+        counts = self.counts[points]
+        gained = int(np.count_nonzero(counts == 0))
+        self.counts[points] = counts + 1
+        self.selected[s] = True
+        self.uncovered -= gained
+        self.cost += 1
+        return gained
+
+    def remove(self, s: int) -> int:
+        '''Drops set s, returns the points left uncovered'''
+        if not self.selected[s]:
+            return 0
+        points = self._indices[self._indptr[s]:self._indptr[s + 1]]
+        counts = self.counts[points]
+        lost = int(np.count_nonzero(counts == 1))
+        self.counts[points] = counts - 1
+        self.selected[s] = False
+        self.uncovered += lost
+        self.cost -= 1
+        return lost
+
+    def toggle(self, s: int) -> int:
+        '''Flips set s in or out, returns the change of the number of uncovered points'''
+        return self.remove(s) if self.selected[s] else -self.add(s)
+
+    def solution(self) -> np.ndarray:
+        return self.selected.copy()
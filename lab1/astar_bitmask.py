@@ -0,0 +1,177 @@
+"""
+A* for the set covering problem of a-star.ipynb with integer bitmasks.
+
+A state is only the mask of the covered elements: two paths covering the same elements with the same
+number of sets are the same node, and the chosen sets are rebuilt at the end from parent links.
+Successors only take the sets containing the lowest uncovered element (one of them has to be in any
+cover, so no solution is lost and the same cover is not generated in every order), and sets contained
+in another set are dropped before the search. The best greedy cover is kept as incumbent, nodes whose
+lower bound cannot beat it are never pushed on the open set.
+
+    python astar_bitmask.py 100            # problem(100) from the notebook
+"""
+import heapq
+import random
+import sys
+import time
+
+
+def problem(N, fixed_seed=42):
+    """Creates an instance of the problem with a fixed seed, as in the notebook"""
+    random.seed(fixed_seed)
+
+    p = [
+        list(set(random.randint(0, N - 1) for n in range(random.randint(N // 5, N // 2))))
+        for _ in range(random.randint(N, N * 5))
+    ]
+
+    return p
+
+
+def to_masks(all_lists):
+    """Bitmask of every set, duplicates and sets contained in another one removed, with their first index"""
+    first_index = {}
+    for i, elements in enumerate(all_lists):
+        mask = 0
+        for e in elements:
+            mask |= 1 << e
+        first_index.setdefault(mask, i)
+    # a set is dominated when a different set contains it; checking against larger sets is enough
+    by_size = sorted(first_index, key=lambda m: -m.bit_count())
+    kept = []
+    for mask in by_size:
+        if mask and not any(mask & other == mask for other in kept):
+            kept.append(mask)
+    return [(mask, first_index[mask]) for mask in kept]
+
+
+def heuristic_size(uncovered, masks, largest):
+    """Admissible: every set covers at most `largest` of the uncovered elements"""
+    return -(-uncovered.bit_count() // largest)
+
+
+def heuristic_gain(uncovered, masks, largest):
+    """Admissible and tighter: the largest number of uncovered elements a single set can still cover"""
+    best = max((m & uncovered).bit_count() for m in masks)
+    return -(-uncovered.bit_count() // best) if best else float("inf")
+
+
+def greedy_cover(goal, masks, covered=0):
+    """Indices of the sets picked by the greedy algorithm (largest number of new elements first)"""
+    chosen = []
+    while covered != goal:
+        k = max(range(len(masks)), key=lambda k: (masks[k] & ~covered).bit_count())
+        covered |= masks[k]
+        chosen.append(k)
+    return chosen
+
+
+def best_greedy_cover(goal, masks):
+    """Shortest of the greedy covers starting from each of the sets"""
+    return min(([k] + greedy_cover(goal, masks, masks[k]) for k in range(len(masks))), key=len)
+
+
+HEURISTICS = {"size": heuristic_size, "gain": heuristic_gain}
+
+
+def astar_search(N, all_lists, heuristic="gain"):
+    """
+    Optimal cover of range(N) with the sets of all_lists. Returns a dict with the indices of the chosen
+    sets (None when no cover exists), the nodes expanded and generated, the peak size of the open set
+    and the time in seconds.
+    """
+    start = time.perf_counter()
+    h = HEURISTICS[heuristic]
+    goal = (1 << N) - 1
+    sets = to_masks(all_lists)
+    masks = [mask for mask, _ in sets]
+    largest = max((m.bit_count() for m in masks), default=0)
+    # sets containing each element, the successors of a state missing it
+    containing = [[k for k, m in enumerate(masks) if m >> e & 1] for e in range(N)]
+    stats = {"expanded": 0, "generated": 0, "peak_open": 0}
+
+    def result(chosen):
+        stats.update(solution=chosen, seconds=time.perf_counter() - start)
+        return stats
+
+    reachable = 0
+    for m in masks:
+        reachable |= m
+    if reachable & goal != goal:
+        return result(None)
+
+    # a greedy cover is the first incumbent: nodes that cannot beat it are not even pushed
+    incumbent = best_greedy_cover(goal, masks)
+    best_g = {0: 0}
+    parent = {0: None}  # covered mask -> (previous mask, set index)
+
+    def path(covered):
+        chosen = []
+        while parent[covered] is not None:
+            covered, k = parent[covered]
+            chosen.append(k)
+        return chosen[::-1]
+
+    counter = 0  # between equal f the deeper node first, then FIFO
+    # Nodes are pushed with the cheap bound of heuristic_size and get the real heuristic only when popped.
+    open_set = [(h(goal, masks, largest), 0, counter, 0, True)]
+    while open_set:
+        stats["peak_open"] = max(stats["peak_open"], len(open_set))
+        f, negative_g, _, covered, exact = heapq.heappop(open_set)
+        if f >= len(incumbent):
+            break  # nothing left can use fewer sets than the incumbent
+        g = -negative_g
+        if g > best_g[covered]:
+            continue  # stale entry, the mask was reached again with fewer sets
+        if not exact:
+            exact_f = g + h(goal & ~covered, masks, largest)
+            if exact_f > f:
+                counter += 1
+                heapq.heappush(open_set, (exact_f, negative_g, counter, covered, True))
+                continue
+        stats["expanded"] += 1
+        uncovered = goal & ~covered
+        lowest = (uncovered & -uncovered).bit_length() - 1
+        for k in containing[lowest]:
+            new_covered = covered | masks[k]
+            if best_g.get(new_covered, g + 2) <= g + 1:
+                continue
+            stats["generated"] += 1
+            if new_covered == goal:
+                if g + 1 < len(incumbent):
+                    incumbent = path(covered) + [k]
+                continue
+            # the heuristic is consistent, so the f of the parent is also a lower bound of the child
+            rest = goal & ~new_covered
+            bound = max(f, g + 1 + heuristic_size(rest, masks, largest))
+            if bound >= len(incumbent):
+                continue
+            if bound == len(incumbent) - 1 == g + 2:
+                # only a single set covering all the rest would beat the incumbent, look for it right away
+                lowest_rest = (rest & -rest).bit_length() - 1
+                last = next((j for j in containing[lowest_rest] if masks[j] & rest == rest), None)
+                if last is not None:
+                    incumbent = path(covered) + [k, last]
+                continue
+            best_g[new_covered] = g + 1
+            parent[new_covered] = (covered, k)
+            counter += 1
+            heapq.heappush(open_set, (bound, -(g + 1), counter, new_covered, False))
+    return result([sets[k][1] for k in incumbent])
+
+
+def astar(N, all_lists):
+    """Drop-in replacement of the notebook astar: the chosen sets as lists, None when there is no cover"""
+    chosen = astar_search(N, all_lists)["solution"]
+    return None if chosen is None else [all_lists[i] for i in chosen]
+
+
+if __name__ == "__main__":
+    for N in map(int, sys.argv[1:] or ["10", "20", "50", "100"]):
+        report = astar_search(N, problem(N))
+        solution = report["solution"]
+        print(
+            f"N={N}: {'no cover' if solution is None else f'{len(solution)} sets {solution}'}, "
+            f"{report['expanded']} expanded, {report['generated']} generated, "
+            f"peak open {report['peak_open']}, {report['seconds']:.3f}s"
+        )
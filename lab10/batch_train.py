@@ -0,0 +1,207 @@
+'''
+Q-learning of lab10.ipynb on many tic-tac-toe boards at once.
+
+train() and play_games() follow the notebook functions on a (boards, 9) int8 array of boards (0 empty, 1 X,
+2 O): moves, line checks and Q-updates are single NumPy operations over many games. play_games() plays its
+games in lockstep. train() keeps the boards on a conveyor instead: each step the player to move plays on every
+board where it is its turn and the table is updated right away, a board starts the next game as soon as its
+game ends, and the first games are spread over the plies. The table then changes every step rather than once
+per batch of games. Epsilon of a trained player is 0.05 * 0.99^(game / boards), 0.99^game in the notebook.
+
+How well the trained player learns depends on how many games each board plays (a board ahead of the others
+does not see the updates of the games in flight), so train() uses at most one board per GAMES_PER_BOARD games:
+30 boards for 30,000 games, 1000 for a million, batch_size (4096 by default) beyond. With batch_size=1 it is
+the notebook algorithm, step for step. compare() measures the trained player against batch_size=1:
+
+    Q_X, Q_O, rewards_X, rewards_O = train(n_games=100_000, train_X=True, train_O=False, is_random=True)
+    win_stats, first_X, first_O = play_games(1000, Q_X, Q_O, X_strategy='greedy', O_strategy='eps_greedy', eps_O=1)
+
+    python batch_train.py --games 30000 --player O    # exit status 1 when the batched player is worse
+'''
+import argparse
+import itertools
+import sys
+from collections import Counter
+import numpy as np
+from q_table import QTable, encode
+
+LINES = np.array([[0, 1, 2], [3, 4, 5], [6, 7, 8], [0, 3, 6], [1, 4, 7], [2, 5, 8], [0, 4, 8], [2, 4, 6]])
+
+# (win, loss, any other move) rewards of TicTacToe.my_move
+REWARDS = {'goal_reward': (1, -1, 0), 'action_penalty': (0, -10, -1)}
+
+# games each board of train() plays at least, fewer would update the table too rarely per game
+GAMES_PER_BOARD = 1000
+
+
+def wins(boards: np.ndarray, piece: int) -> np.ndarray:
+    '''Boards on which piece has a full line'''
+    return (boards[:, LINES] == piece).all(axis=2).any(axis=1)
+
+
+def _choose(q: QTable, codes, strategy: str, eps, rng) -> np.ndarray:
+    if strategy == 'greedy':
+        return q.greedy(codes, rng, codes=True)
+    return q.epsilon_greedy(codes, eps, rng, codes=True)
+
+
+def boards_in_flight(n_games: int, batch_size: int) -> int:
+    '''Boards train() plays on: batch_size, or fewer so that each board plays GAMES_PER_BOARD games'''
+    return max(1, min(batch_size, n_games // GAMES_PER_BOARD))
+
+
+def train(n_games=1000, alpha=0.5, gamma=0.9, train_X=True, train_O=False, is_random=True, Q_X=None, Q_O=None,
+          reward_type='goal_reward', symmetry=False, batch_size=4096, seed=1):
+    '''
+    train() of the notebook on boards_in_flight(n_games, batch_size) boards at once. A trained player plays
+    epsilon greedy with the decaying epsilon, every other one plays at random (epsilon greedy with eps=1) when
+    is_random, greedily on its table otherwise. Returns the two QTables and the final reward of every game for
+    each player.
+    '''
+    rng = np.random.default_rng(seed)
+    if Q_X is not None:
+        assert not train_X, 'Train flag should be set to False if Q table is being provided'
+    if Q_O is not None:
+        assert not train_O, 'Train flag should be set to False if Q table is being provided'
+    tables = [Q_X if Q_X is not None else QTable('X', symmetry), Q_O if Q_O is not None else QTable('O', symmetry)]
+    training = [train_X, train_O]
+    strategies = ['eps_greedy' if flag or is_random else 'greedy' for flag in training]
+    win, _, step = REWARDS[reward_type]
+    rewards = [np.zeros(n_games, dtype=np.float32), np.zeros(n_games, dtype=np.float32)]
+
+    n = boards_in_flight(n_games, batch_size)
+    boards = np.zeros((n, 9), dtype=np.int8)
+    plies = np.zeros(n, dtype=np.int64)
+    game = np.full(n, -1)  # game played on each board, -1 when the board is idle
+    # last move of each player on each board, waiting for the reply of the opponent to be updated
+    last_state = np.zeros((2, n), dtype=np.int64)
+    last_action = np.zeros((2, n), dtype=np.int64)
+    last_reward = np.zeros((2, n))
+    started = 0
+
+    for turn in itertools.count():
+        p, other = turn % 2, 1 - turn % 2
+        if p == 0 and started < n_games:
+            idle = np.flatnonzero(game < 0)
+            if turn < 18:
+                idle = idle[:-(-n // 9)]  # a ninth of the boards per move of X, the games then end at any ply
+            idle = idle[:n_games - started]
+            game[idle] = np.arange(started, started + len(idle))
+            boards[idle], plies[idle] = 0, 0
+            started += len(idle)
+        elif started == n_games and np.all(game < 0):
+            break
+        moving = np.flatnonzero((game >= 0) & (plies % 2 == p))
+        if len(moving) == 0:
+            continue
+        q = tables[p]
+        codes = encode(boards[moving])
+        if training[p]:
+            # Q-learning update of the previous move, now that the opponent has answered
+            answered = moving[plies[moving] >= 2]
+            if len(answered):
+                target = last_reward[p, answered] + gamma * q.max_q(codes[plies[moving] >= 2], codes=True)
+                q.update(last_state[p, answered], last_action[p, answered], target, alpha, codes=True)
+        # epsilon decays by 0.99 every n games, as after every game in the notebook
+        eps = 0.05 * 0.99 ** (game[moving] // n) if training[p] else 1.0
+        actions = _choose(q, codes, strategies[p], eps, rng)
+        boards[moving, actions] = p + 1
+        won = wins(boards[moving], p + 1)
+        over = won | (plies[moving] == 8)
+        reward = np.where(won, win, step).astype(np.float64)
+
+        ended = moving[over]
+        if over.any():
+            if training[p]:
+                # the value of a terminal state is 0
+                q.update(codes[over], actions[over], reward[over], alpha, codes=True)
+            if training[other]:
+                tables[other].update(last_state[other, ended], last_action[other, ended], -reward[over], alpha,
+                                     codes=True)
+            rewards[p][game[ended]] = reward[over]
+            rewards[other][game[ended]] = -reward[over]
+
+        last_state[p, moving], last_action[p, moving], last_reward[p, moving] = codes, actions, reward
+        plies[moving] += 1
+        game[ended] = -1
+
+    return tables[0], tables[1], rewards[0], rewards[1]
+
+
+def play_games(n_games, Q_X, Q_O, X_strategy='eps_greedy', O_strategy='eps_greedy', eps_X=0.05, eps_O=0.05, seed=1,
+               batch_size=4096):
+    '''
+    play_games() of the notebook: win counts and the most frequent first move (row, column) of each player.
+    Q_X and Q_O are QTables or the dict tables of the notebook.
+    '''
+    rng = np.random.default_rng(seed)
+    tables = [Q if isinstance(Q, QTable) else QTable.from_dict(Q, player) for Q, player in ((Q_X, 'X'), (Q_O, 'O'))]
+    strategies, eps = [X_strategy, O_strategy], [eps_X, eps_O]
+    win_stats = {'X_win': 0, 'O_win': 0, 'Draw': 0}
+    first_actions = [Counter(), Counter()]
+
+    for start in range(0, n_games, batch_size):
+        n = min(batch_size, n_games - start)
+        boards = np.zeros((n, 9), dtype=np.int8)
+        running = np.arange(n)
+        for ply in range(9):
+            p = ply % 2
+            actions = _choose(tables[p], encode(boards[running]), strategies[p], eps[p], rng)
+            if ply < 2:
+                first_actions[p].update(actions.tolist())
+            boards[running, actions] = p + 1
+            won = wins(boards[running], p + 1)
+            win_stats['X_win' if p == 0 else 'O_win'] += int(won.sum())
+            running = running[~won]
+            if len(running) == 0:
+                break
+        win_stats['Draw'] += len(running)
+
+    most_common = [divmod(c.most_common(1)[0][0], 3) if c else None for c in first_actions]
+    return win_stats, most_common[0], most_common[1]
+
+
+def compare(n_games, batch_size=4096, player='O', eval_games=10_000, seeds=(1, 2, 3), **kwargs) -> dict:
+    '''
+    Quality check of batch_size against the scalar trainer (batch_size=1, the notebook algorithm): player is
+    trained against a random opponent with both, then plays eval_games greedy games against a random opponent.
+    Returns {batch size: {'win', 'loss', 'draw'}}, the shares of the games of the trained player averaged
+    over the seeds. kwargs go to train (alpha, gamma, reward_type, symmetry).
+    '''
+    trained_X = player == 'X'
+    results = {}
+    for size in dict.fromkeys((1, batch_size)):
+        shares = Counter()
+        for seed in seeds:
+            Q_X, Q_O, _, _ = train(n_games, train_X=trained_X, train_O=not trained_X, is_random=True,
+                                   batch_size=size, seed=seed, **kwargs)
+            stats, _, _ = play_games(eval_games, Q_X, Q_O, X_strategy='greedy' if trained_X else 'eps_greedy',
+                                     O_strategy='eps_greedy' if trained_X else 'greedy', eps_X=1, eps_O=1, seed=seed)
+            mine, theirs = ('X_win', 'O_win') if trained_X else ('O_win', 'X_win')
+            shares.update({'win': stats[mine], 'loss': stats[theirs], 'draw': stats['Draw']})
+        results[size] = {k: shares[k] / (eval_games * len(seeds)) for k in ('win', 'loss', 'draw')}
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='compare the players trained with a batch size and with batch_size=1')
+    parser.add_argument('--games', type=int, default=30_000, help='training games')
+    parser.add_argument('--batch-size', type=int, default=4096, help='most boards played at once')
+    parser.add_argument('--player', choices=('X', 'O'), default='O', help='the trained player')
+    parser.add_argument('--eval-games', type=int, default=10_000, help='games against a random opponent per seed')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--tolerance', type=float, default=0.01, help='extra share of lost games accepted')
+    args = parser.parse_args(argv)
+
+    results = compare(args.games, args.batch_size, args.player, args.eval_games, args.seeds)
+    for size, r in results.items():
+        print(f"batch_size={size:<6} ({boards_in_flight(args.games, size)} boards)  win {r['win']:6.1%}  "
+              f"loss {r['loss']:6.1%}  draw {r['draw']:6.1%}")
+    if results[args.batch_size]['loss'] > results[1]['loss'] + args.tolerance:
+        print(f'batch_size={args.batch_size} loses more than {args.tolerance:.1%} more games than batch_size=1')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+'''
+Array backed Q-table for the tic-tac-toe Q-learning of lab10.ipynb.
+
+A state is the tuple of the notebook (9 cells, 0 empty, 1 X, 2 O, row by row) and an action the index of a
+cell, the position (r, c) of the board is action 3 * r + c. States are encoded in base 3 and mapped to dense
+rows of a (n_states, 9) float32 array through a lookup table over all the 3^9 codes, so reading or updating Q
+is array indexing instead of hashing tuples. Illegal actions (occupied cells) hold -inf, greedy choices are a
+plain argmax. With symmetry=True the 8 rotations and reflections of a board share the same row, and the
+actions a symmetric board cannot tell apart (the four corners of the empty board) share the same entry.
+The methods take states as boards, or as base-3 codes with codes=True (what batched callers already have).
+
+    q = QTable('X', symmetry=True, path='q_x.npy')   # memory mapped, loaded if the file exists
+    action = q.epsilon_greedy(state, eps=0.05, rng=rng)
+    q.update(state, action, target, alpha=0.5)
+    q.flush()
+'''
+import os
+import numpy as np
+
+POWERS = 3 ** np.arange(8, -1, -1)  # first cell is the most significant digit
+N_CODES = 3 ** 9
+
+# every rotation and reflection of the board as a permutation of the cells: transformed[j] = board[perm[j]]
+_GRID = np.arange(9).reshape(3, 3)
+SYMMETRIES = np.array([np.rot90(g, r).ravel() for g in (_GRID, _GRID.T) for r in range(4)])
+# action of the transformed board corresponding to each action of the original one
+ACTION_MAPS = np.argsort(SYMMETRIES, axis=1)
+
+
+def encode(states) -> np.ndarray:
+    '''Base-3 codes of states given as (..., 9) arrays or tuples'''
+    return np.asarray(states, dtype=np.int64) @ POWERS
+
+
+def decode(codes) -> np.ndarray:
+    '''(..., 9) int8 cells of base-3 codes'''
+    codes = np.asarray(codes, dtype=np.int64)
+    return (codes[..., None] // POWERS % 3).astype(np.int8)
+
+
+def player_states(player: str) -> np.ndarray:
+    '''Codes of the states in which player is to move, with the same rule as TicTacToe.my_states'''
+    cells = decode(np.arange(N_CODES))
+    empty, x, o = ((cells == v).sum(axis=1) for v in range(3))
+    if player == 'X':
+        mine = (empty % 2 == 1) & (x == o)
+    else:
+        mine = (empty % 2 == 0) & (x == o + 1)
+    return np.flatnonzero(mine)
+
+
+class QTable:
+    '''
+    player: 'X' or 'O', the states of the table are the ones where the player is to move
+    symmetry: share a row between the symmetric boards
+    path: .npy file of the values, opened memory mapped when it exists (a new table is created there otherwise)
+    '''
+
+    def __init__(self, player: str = 'X', symmetry: bool = False, path: str = None):
+        if player not in ('X', 'O'):
+            raise ValueError(f'player must be X or O, not {player!r}')
+        self.player = player
+        self.symmetry = symmetry
+        self.path = path
+        codes = player_states(player)
+        if symmetry:
+            transformed = encode(decode(codes)[:, SYMMETRIES])  # (n, 8) codes of the symmetric boards
+            transform = transformed.argmin(axis=1)
+            canonical = transformed[np.arange(len(codes)), transform]
+        else:
+            transform = np.zeros(len(codes), dtype=np.int64)
+            canonical = codes
+        rows, dense = np.unique(canonical, return_inverse=True)
+        # code -> row of the table (-1 for states of the other player) and symmetry taking it to that row
+        self.index = np.full(N_CODES, -1, dtype=np.int32)
+        self.index[codes] = dense
+        self.transform = np.zeros(N_CODES, dtype=np.int8)
+        self.transform[codes] = transform
+        self.n_states = len(rows)
+        # column of the table of each action of a canonical board, the smallest of its orbit under the
+        # symmetries leaving the board unchanged (only the identity without symmetry)
+        cells = decode(rows)
+        if symmetry:
+            stabilizer = (cells[:, SYMMETRIES] == cells[:, None, :]).all(axis=2)
+            self.columns = np.where(stabilizer[:, :, None], ACTION_MAPS[None], 9).min(axis=1).astype(np.int8)
+        else:
+            self.columns = np.broadcast_to(np.arange(9, dtype=np.int8), (self.n_states, 9))
+        initial = np.where(cells == 0, 0, -np.inf).astype(np.float32)
+        self.values = self._open(path, initial)
+
+    def _open(self, path, initial) -> np.ndarray:
+        if path is None:
+            return initial
+        if os.path.exists(path):
+            values = np.load(path, mmap_mode='r+')
+            if values.shape != initial.shape or values.dtype != np.float32:
+                raise ValueError(f'{path} is not a Q-table of player {self.player} with symmetry={self.symmetry}')
+            return values
+        values = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=initial.shape)
+        values[:] = initial
+        return values
+
+    def _locate(self, states, codes: bool = False):
+        '''
+        Rows of the table and column of every action of one state or of many: boards given as a state tuple
+        or a (..., 9) array of cells, or base-3 codes (an int or an array of any shape) when codes is True
+        '''
+        states = np.asarray(states)
+        integers = np.issubdtype(states.dtype, np.integer)
+        if codes:
+            if not integers or np.any((states < 0) | (states >= N_CODES)):
+                raise ValueError(f'codes must be integers in [0, {N_CODES})')
+        elif not integers or states.shape[-1:] != (9,) or np.any((states < 0) | (states > 2)):
+            raise ValueError('states must be boards of 9 cells in 0, 1, 2, pass codes=True for base-3 codes')
+        else:
+            states = encode(states)
+        rows = self.index[states]
+        if np.any(rows < 0):
+            raise KeyError(f'state not in the table of player {self.player}')
+        return rows, np.take_along_axis(self.columns[rows], ACTION_MAPS[self.transform[states]], axis=-1)
+
+    def q(self, states, codes: bool = False) -> np.ndarray:
+        '''(..., 9) action values of the states, -inf for the occupied cells'''
+        rows, columns = self._locate(states, codes)
+        return np.take_along_axis(self.values[rows], columns.astype(np.intp), axis=-1)
+
+    def max_q(self, states, codes: bool = False) -> np.ndarray:
+        '''Value of the best action, 0 for full boards (terminal, as in the notebook)'''
+        best = self.q(states, codes).max(axis=-1)
+        return np.where(np.isneginf(best), 0, best)
+
+    def greedy(self, states, rng: np.random.Generator = None, codes: bool = False) -> np.ndarray:
+        '''Best action of each state, ties broken at random as in pick_best_action'''
+        q = self.q(states, codes)
+        ties = q == q.max(axis=-1, keepdims=True)
+        if rng is None:
+            rng = np.random.default_rng()
+        return np.argmax(ties * rng.random(ties.shape), axis=-1)
+
+    def epsilon_greedy(self, states, eps: float, rng: np.random.Generator = None, codes: bool = False) -> np.ndarray:
+        '''The greedy action with probability 1 - eps, otherwise a random legal one (same law as the notebook)'''
+        if rng is None:
+            rng = np.random.default_rng()
+        q = self.q(states, codes)
+        best = self.greedy(states, rng, codes)
+        legal = ~np.isneginf(q)
+        random_action = np.argmax(legal * rng.random(legal.shape), axis=-1)
+        return np.where(rng.random(np.shape(best)) < eps, random_action, best)
+
+    def update(self, states, actions, targets, alpha: float, codes: bool = False) -> None:
+        '''
+        Q(s, a) += alpha * (target - Q(s, a)). In a batch, a pair repeated n times moves as n successive
+        updates towards the mean of its targets: Q = (1 - alpha)^n Q + (1 - (1 - alpha)^n) mean(targets).
+        '''
+        rows, columns = self._locate(states, codes)
+        columns = np.take_along_axis(columns, np.asarray(actions)[..., None], axis=-1)[..., 0]
+        pairs, inverse, counts = np.unique(np.ravel(rows) * 9 + np.ravel(columns), return_inverse=True, return_counts=True)
+        targets = np.broadcast_to(np.asarray(targets, dtype=np.float64), np.shape(rows)).ravel()
+        mean = np.bincount(inverse, targets, len(pairs)) / counts
+        keep = (1 - alpha) ** counts
+        rows, columns = pairs // 9, pairs % 9
+        self.values[rows, columns] = keep * self.values[rows, columns] + (1 - keep) * mean
+
+    def flush(self) -> None:
+        '''Writes a memory mapped table to disk'''
+        if isinstance(self.values, np.memmap):
+            self.values.flush()
+
+    def save(self, path: str) -> None:
+        np.save(path, self.values)
+
+    @classmethod
+    def load(cls, path: str, player: str = 'X', symmetry: bool = False) -> 'QTable':
+        '''The table saved in path, memory mapped'''
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return cls(player, symmetry, path)
+
+    def to_dict(self) -> dict:
+        '''Nested dict {state: {action: value}} of initialize_Q, to use the table with the notebook functions'''
+        codes = np.flatnonzero(self.index >= 0)
+        q = self.q(codes, codes=True)
+        return {
+            tuple(int(c) for c in cells): {int(a): float(q[i, a]) for a in np.flatnonzero(cells == 0)}
+            for i, cells in enumerate(decode(codes))
+        }
+
+    @classmethod
+    def from_dict(cls, Q: dict, player: str = 'X', symmetry: bool = False, path: str = None) -> 'QTable':
+        '''Table holding the values of a notebook Q dict (with symmetry, the last of the symmetric states wins)'''
+        table = cls(player, symmetry, path)
+        for state, actions in Q.items():
+            if actions:
+                row, columns = table._locate(state)
+                for action, value in actions.items():
+                    table.values[row, columns[action]] = value
+        return table
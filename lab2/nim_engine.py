@@ -0,0 +1,224 @@
+"""
+Nim engine for the lab2 strategies, without deepcopy and binary strings.
+
+The game is the one of the notebooks: rows of 1, 3, 5, ... objects, a ply removes objects from one row
+(at most k when k is given) and whoever takes the last object loses (misère).
+
+The analysis relies on Sprague-Grundy values: a row of c objects is worth grundy(c), c itself without k and
+c mod (k + 1) with the bound, kept in a memoized GrundyTable. Subtraction games are tame, so the misère
+outcome follows the normal play one: a position is lost for the player to move when the XOR of the values
+is 0 while some row is worth 2 or more, or when it is 1 while every row is worth at most 1.
+That gives the winning plies with one pass over the rows.
+
+    nim = Nim(5)
+    ply = optimal(nim)                                   # a winning ply whenever there is one
+    self_play(optimal, pure_random, games=1000, num_rows=20, seed=0)
+"""
+import random
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from functools import reduce
+from operator import xor
+
+Nimply = namedtuple("Nimply", "row, num_objects")
+
+
+class GrundyTable:
+    """Memoized Sprague-Grundy values of one row of the subtraction game {1, ..., k}"""
+
+    def __init__(self, k: int = None) -> None:
+        self.k = k
+        self._values = [0]
+        self._positions = {0: [0]}  # value -> row sizes worth it, increasing
+
+    def values(self, n: int) -> list:
+        """The table, extended up to n"""
+        values = self._values
+        while len(values) <= n:
+            m = len(values)
+            reachable = set(values[max(0, m - self.k):m]) if self.k is not None else set(values)
+            g = next(g for g in range(len(reachable) + 1) if g not in reachable)
+            values.append(g)
+            self._positions.setdefault(g, []).append(m)
+        return values
+
+    def __call__(self, n: int) -> int:
+        if self.k is None:
+            return n
+        return self.values(n)[n]
+
+    def move_to(self, c: int, target: int):
+        """Objects to take from a row of c objects so that it is worth target, None if it cannot be done"""
+        if self.k is None:
+            return c - target if target < c else None
+        self.values(c)
+        positions = self._positions.get(target, ())
+        i = bisect_left(positions, c)  # the largest size below c worth target
+        if i == 0 or c - positions[i - 1] > self.k:
+            return None
+        return c - positions[i - 1]
+
+
+_TABLES = {}
+
+
+def grundy_table(k: int = None) -> GrundyTable:
+    """Shared table for every game with the same k"""
+    table = _TABLES.get(k)
+    if table is None:
+        table = _TABLES[k] = GrundyTable(k)
+    return table
+
+
+class Nim:
+    """
+    Same interface as the Nim of the notebooks. Keeps the XOR of the rows (nim_sum), the Grundy value of
+    every row, their XOR and the number of rows worth 2 or more up to date, so a ply costs O(1) and the
+    search of a winning ply stops at the first row that has one.
+    """
+
+    __slots__ = ("_rows", "_k", "_total", "nim_sum", "_grundy", "_values", "_grundy_sum", "_fertile")
+
+    def __init__(self, num_rows: int, k: int = None, rows=None) -> None:
+        self._rows = list(rows) if rows is not None else [i * 2 + 1 for i in range(num_rows)]
+        self._k = k
+        self._total = sum(self._rows)
+        self.nim_sum = reduce(xor, self._rows, 0)
+        self._grundy = grundy_table(k)
+        if k is None:
+            self._values = self._rows
+        else:
+            table = self._grundy.values(max(self._rows, default=0))
+            self._values = [table[c] for c in self._rows]
+        self._grundy_sum = reduce(xor, self._values, 0)
+        self._fertile = sum(1 for v in self._values if v >= 2)
+
+    def __bool__(self):
+        return self._total > 0
+
+    def __str__(self):
+        return "<" + " ".join(str(_) for _ in self._rows) + ">"
+
+    @property
+    def rows(self) -> tuple:
+        return tuple(self._rows)
+
+    @property
+    def k(self) -> int:
+        return self._k
+
+    def nimming(self, ply: Nimply) -> None:
+        row, num_objects = ply
+        assert 0 < num_objects <= self._rows[row]
+        assert self._k is None or num_objects <= self._k
+        before = self._rows[row]
+        after = self._rows[row] = before - num_objects
+        self._total -= num_objects
+        self.nim_sum ^= before ^ after
+        if self._k is not None:
+            old, new = self._values[row], self._grundy(after)
+            self._values[row] = new
+            self._grundy_sum ^= old ^ new
+            self._fertile += (new >= 2) - (old >= 2)
+        else:
+            self._grundy_sum = self.nim_sum
+            self._fertile += (after >= 2) - (before >= 2)
+
+    def copy(self) -> "Nim":
+        return Nim(0, self._k, self._rows)
+
+    def winning_plies(self, misere: bool = True, first_only: bool = False) -> list:
+        """Every ply leaving the opponent in a lost position, empty when the position is lost"""
+        grundy, values, total, fertile = self._grundy, self._values, self._grundy_sum, self._fertile
+        plies = []
+        for r, c in enumerate(self._rows):
+            if c == 0:
+                continue
+            value = values[r]
+            others_xor = total ^ value
+            if misere and fertile - (value >= 2) == 0:
+                # no other row worth 2 or more: this one has to be left so that the XOR is 1
+                target = others_xor ^ 1
+            else:
+                target = others_xor
+            taken = grundy.move_to(c, target)
+            if taken is not None:
+                plies.append(Nimply(r, taken))
+                if first_only:
+                    return plies
+        return plies
+
+
+def nim_sum(state) -> int:
+    """XOR of the rows of a Nim or of a sequence of row sizes"""
+    return state.nim_sum if isinstance(state, Nim) else reduce(xor, state, 0)
+
+
+def winning_plies(rows, k: int = None, misere: bool = True, first_only: bool = False) -> list:
+    """Every ply leaving the opponent in a lost position, empty when the position is lost"""
+    return Nim(0, k, rows).winning_plies(misere, first_only)
+
+
+def is_winning(rows, k: int = None, misere: bool = True) -> bool:
+    """True when the player to move can force a win"""
+    if not any(rows):
+        return misere  # the opponent took the last object
+    table = grundy_table(k).values(max(rows)) if k is not None else None
+    values = rows if k is None else [table[c] for c in rows]
+    total = reduce(xor, values, 0)
+    if misere and max(values) <= 1:
+        return total != 1
+    return total != 0
+
+
+def pure_random(state: Nim) -> Nimply:
+    """A completely random move"""
+    rows = state.rows
+    row = random.choice([r for r, c in enumerate(rows) if c > 0])
+    limit = rows[row] if state.k is None else min(state.k, rows[row])
+    return Nimply(row, random.randint(1, limit))
+
+
+def gabriele(state: Nim) -> Nimply:
+    """Pick always the maximum possible number of the lowest row"""
+    rows = state.rows
+    row = next(r for r, c in enumerate(rows) if c > 0)
+    return Nimply(row, rows[row] if state.k is None else min(state.k, rows[row]))
+
+
+def optimal(state: Nim) -> Nimply:
+    """A winning ply when there is one, otherwise a random move"""
+    if isinstance(state, Nim):
+        plies = state.winning_plies(first_only=True)
+    else:
+        plies = winning_plies(state.rows, state.k, first_only=True)
+    return plies[0] if plies else pure_random(state)
+
+
+def play_game(strategies, num_rows: int, k: int = None) -> int:
+    """Plays one game, returns the index of the winner (the player who did not take the last object)"""
+    nim = Nim(num_rows, k)
+    player = 0
+    while nim:
+        nim.nimming(strategies[player](nim))
+        player = 1 - player
+    return player
+
+
+def self_play(first, second, games: int = 1000, num_rows: int = 5, k: int = None, seed: int = None) -> dict:
+    """Plays {games} games, first always moving first, returns the win rate of first and the games per second"""
+    if seed is not None:
+        random.seed(seed)
+    start = time.perf_counter()
+    wins = sum(play_game((first, second), num_rows, k) == 0 for _ in range(games))
+    elapsed = time.perf_counter() - start
+    return {"win_rate": wins / games, "games_per_s": games / elapsed, "ms_per_game": elapsed / games * 1000}
+
+
+if __name__ == "__main__":
+    for num_rows, k in ((5, None), (5, 3), (100, None), (100, 7)):
+        for opponent in (pure_random, gabriele, optimal):
+            r = self_play(optimal, opponent, games=1000, num_rows=num_rows, k=k, seed=0)
+            print(f"rows={num_rows:3d} k={k}: optimal vs {opponent.__name__:11s} win rate {r['win_rate']:.1%}, "
+                  f"{r['ms_per_game']:.3f} ms/game")
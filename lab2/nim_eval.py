@@ -0,0 +1,229 @@
+"""
+Parallel fitness evaluation for the adaptive Nim evolution of lab2_nim_adaptive.ipynb.
+
+play(agent, opponent) of the notebook becomes play_games: the same 100 games, the opponent moving first and
+the agent second, on a plain list of rows with a running total, strategies see the list itself (no deepcopy,
+no tuple of the rows per move). Every evaluation gets its own random.Random seeded from the evaluator seed in
+submission order, so fitness values do not depend on the number of workers or on which worker ran them.
+
+    with FitnessEvaluator("pure_random", games=100, seed=0) as evaluate:
+        fitness = evaluate([agent.genotype for agent in population])
+        print(evaluate.worker_stats())               # games per second of every worker
+
+    python nim_eval.py --opponent pure_random --population 200 --generations 100 --workers 4
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from nim_engine import winning_plies
+
+
+def adaptive_move(rows: list, genotype) -> tuple:
+    """
+    The adaptive strategy of the notebook. Every branch takes the max over the moves (row, objects) of
+    (row + genotype[0], objects + genotype[1]): the genotype shifts both keys by a constant, so the choice
+    is always the whole last non-empty row. The genotype stays a parameter to keep the signature.
+    """
+    row = len(rows) - 1
+    while rows[row] == 0:
+        row -= 1
+    return row, rows[row]
+
+
+def random_move(rows: list, rng: random.Random) -> tuple:
+    """pure_random of the notebook: a random non-empty row, a random number of objects"""
+    row = rng.choice([r for r, c in enumerate(rows) if c > 0])
+    return row, rng.randint(1, rows[row])
+
+
+def gabriele_move(rows: list, rng: random.Random) -> tuple:
+    """gabriele of the notebook: the whole first non-empty row"""
+    row = 0
+    while rows[row] == 0:
+        row += 1
+    return row, rows[row]
+
+
+def spicy_move(rows: list, rng: random.Random) -> tuple:
+    """
+    optimal of the notebook: a random move among the ones leaving a nim-sum other than 0, any move when there
+    is none. Each row has at most one move to nim-sum 0 (leaving c ^ nim_sum objects), so the pick is an index
+    over the counts instead of a deepcopy of the game per move.
+    """
+    total_xor = 0
+    for c in rows:
+        total_xor ^= c
+    bad = [c - (c ^ total_xor) if c ^ total_xor < c else 0 for c in rows]  # objects to nim-sum 0, 0 for none
+    counts = [c - (b > 0) for c, b in zip(rows, bad)]
+    n = sum(counts)
+    if n == 0:
+        counts, bad, n = rows, [0] * len(rows), sum(rows)  # every move zeroes the nim-sum, pick any
+    i = rng.randrange(n)
+    for row, count in enumerate(counts):
+        if i < count:
+            num_objects = i + 1
+            return row, num_objects + (0 < bad[row] <= num_objects)
+        i -= count
+
+
+def expert_move(rows: list, rng: random.Random) -> tuple:
+    """The misère optimal strategy of nim_engine, a random move in lost positions"""
+    plies = winning_plies(rows, first_only=True)
+    return plies[0] if plies else random_move(rows, rng)
+
+
+OPPONENTS = {"pure_random": random_move, "gabriele": gabriele_move, "optimal": spicy_move, "expert": expert_move}
+
+
+def play_games(genotype, opponent: str = "pure_random", games: int = 100, num_rows: int = 5, seed: int = None) -> float:
+    """play of the notebook: share of the games won by the agent, moving second"""
+    rng = random.Random(seed)
+    opponent_move = OPPONENTS[opponent]
+    initial = [i * 2 + 1 for i in range(num_rows)]
+    wins = 0
+    for _ in range(games):
+        rows = initial[:]
+        total = num_rows * num_rows
+        player = 0
+        while total:
+            row, num_objects = opponent_move(rows, rng) if player == 0 else adaptive_move(rows, genotype)
+            rows[row] -= num_objects
+            total -= num_objects
+            player = 1 - player
+        wins += player  # player 1 is to move when the opponent took the last object
+    return wins / games
+
+
+def _evaluate_chunk(task: tuple) -> tuple:
+    """Runs in a worker process: fitness of a chunk of genotypes, with the pid and the time spent"""
+    genotypes, seeds, opponent, games, num_rows = task
+    start = time.perf_counter()
+    fitness = [play_games(g, opponent, games, num_rows, s) for g, s in zip(genotypes, seeds)]
+    return fitness, os.getpid(), len(genotypes) * games, time.perf_counter() - start
+
+
+class FitnessEvaluator:
+    """
+    Evaluates lists of genotypes over a process pool kept open between calls (workers=0 evaluates in this
+    process). calls counts the evaluations, worker_stats() gives games and games per second of every worker.
+    """
+
+    def __init__(self, opponent: str = "pure_random", games: int = 100, num_rows: int = 5, workers: int = None,
+                 seed: int = None, chunks_per_worker: int = 4):
+        if opponent not in OPPONENTS:
+            raise ValueError(f"unknown opponent {opponent!r}, expected one of {sorted(OPPONENTS)}")
+        self.opponent = opponent
+        self.games = games
+        self.num_rows = num_rows
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunks_per_worker = chunks_per_worker
+        self._seeds = random.Random(seed)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 0 else None
+        self._workers = {}  # pid -> [games, seconds]
+        self.calls = 0
+
+    def __call__(self, genotypes) -> list:
+        genotypes = [list(g) for g in genotypes]
+        seeds = [self._seeds.getrandbits(64) for _ in genotypes]
+        self.calls += len(genotypes)
+        chunks = max(1, self.workers * self.chunks_per_worker)
+        size = -(-len(genotypes) // chunks) or 1
+        tasks = [
+            (genotypes[i:i + size], seeds[i:i + size], self.opponent, self.games, self.num_rows)
+            for i in range(0, len(genotypes), size)
+        ]
+        results = self._pool.map(_evaluate_chunk, tasks) if self._pool else map(_evaluate_chunk, tasks)
+        fitness = []
+        for chunk, pid, games, seconds in results:
+            fitness.extend(chunk)
+            stats = self._workers.setdefault(pid, [0, 0.0])
+            stats[0] += games
+            stats[1] += seconds
+        return fitness
+
+    def worker_stats(self) -> dict:
+        """pid -> {'games', 'seconds', 'games_per_s'} over all the evaluations so far"""
+        return {
+            pid: {"games": games, "seconds": seconds, "games_per_s": games / seconds if seconds else 0.0}
+            for pid, (games, seconds) in self._workers.items()
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def find_best_agent(evaluate: FitnessEvaluator, num_population: int = 200, num_generations: int = 100,
+                    agent_mutations: int = 20, mutation_rate: float = 0.10, num_parents: int = 2,
+                    seed: int = None) -> tuple:
+    """
+    find_best_agent of the notebook with the evaluations batched: the offspring of a generation, mutated or
+    crossed over, are evaluated together (the notebook also played once per mutated gene and then again,
+    only the last value was kept). Returns the best genotype, its fitness and the best fitness per generation.
+    """
+    rng = random.Random(seed)
+    num_rows = evaluate.num_rows
+    genotypes = [[-rng.randint(0, num_rows - 1), 0] for _ in range(num_population)]
+    rates = [[rng.random() for _ in range(2)] for _ in range(num_population)]
+    population = list(zip(evaluate(genotypes), genotypes, rates))
+
+    def select_parent():
+        return max((rng.choice(population) for _ in range(num_parents)), key=lambda a: a[0])
+
+    history = []
+    for _ in range(num_generations):
+        offspring = []
+        for _ in range(agent_mutations):
+            if rng.random() < mutation_rate:
+                _, genotype, mutation_rates = select_parent()
+                genotype, mutation_rates = genotype[:], mutation_rates[:]
+                for i in range(len(genotype)):
+                    if rng.random() < mutation_rates[i]:
+                        genotype[i] += rng.randint(-1, 1)
+                        mutation_rates[i] += rng.random() * 0.1
+            else:
+                first, second = select_parent(), select_parent()
+                gene = rng.randint(0, 1)
+                genotype = [first[1][gene], second[1][1 - gene]]
+                mutation_rates = [rng.random() for _ in range(2)]
+            offspring.append((genotype, mutation_rates))
+        fitness = evaluate([genotype for genotype, _ in offspring])
+        population.extend((f, g, r) for f, (g, r) in zip(fitness, offspring))
+        population.sort(key=lambda a: a[0], reverse=True)
+        population = population[:num_population]
+        history.append(population[0][0])
+    return population[0][1], population[0][0], history
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="lab2 adaptive Nim evolution with parallel fitness evaluation")
+    parser.add_argument("--opponent", choices=sorted(OPPONENTS), default="pure_random")
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--games", type=int, default=100, help="games per fitness evaluation")
+    parser.add_argument("--population", type=int, default=200)
+    parser.add_argument("--generations", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, all cores by default, 0 for none")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    with FitnessEvaluator(args.opponent, args.games, args.rows, args.workers, args.seed) as evaluate:
+        genotype, fitness, _ = find_best_agent(evaluate, args.population, args.generations, seed=args.seed)
+        elapsed = time.perf_counter() - start
+        print(f"best genotype {genotype}, fitness {fitness:.2f}, {evaluate.calls} evaluations in {elapsed:.2f}s")
+        for pid, stats in sorted(evaluate.worker_stats().items()):
+            print(f"worker {pid}: {stats['games']} games, {stats['games_per_s']:,.0f} games/s")
+
+
+if __name__ == "__main__":
+    main()
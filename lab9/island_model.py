@@ -0,0 +1,217 @@
+# Island model for the lab9 problems: every island evolves its own population in a separate process and
+# every `migration_interval` generations the best individuals of each island move to its neighbours.
+#
+#   python island_model.py --problem 10 --islands 4 --generations 200
+#
+# The coordinator talks to the islands through pipes: it sends the immigrants and the number of generations
+# to run, the island answers with its emigrants and its history. Populations are (size, genome_length) uint8
+# arrays, fitness values travel with the migrants so moving them costs no fitness call.
+
+import argparse
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+import lab9_lib
+
+TOPOLOGIES = ("ring", "random")
+
+
+class Island:
+    def __init__(self, problem_size, population_size, offspring_size, genome_length, mutation_rate, tournament_size, seed):
+        self.problem = lab9_lib.make_problem(problem_size)
+        self.offspring_size = offspring_size
+        self.mutation_rate = mutation_rate
+        self.tournament_size = tournament_size
+        self.rng = np.random.default_rng(seed)
+        self.population = self.rng.integers(0, 2, (population_size, genome_length), dtype=np.uint8)
+        self.fitness = self.problem.evaluate_batch(self.population)
+        self._sort()
+
+    def _sort(self):
+        order = np.argsort(-self.fitness, kind="stable")
+        self.population, self.fitness = self.population[order], self.fitness[order]
+
+    def _select(self, n):
+        # tournament selection, returns n parent indices
+        contenders = self.rng.integers(0, len(self.population), (n, self.tournament_size))
+        return contenders[np.arange(n), self.fitness[contenders].argmax(axis=1)]
+
+    def generation(self):
+        # two-point crossover and bit flip mutation of tournament selected parents, then (mu + lambda) survival
+        n, length = self.offspring_size, self.population.shape[1]
+        first, second = self.population[self._select(n)], self.population[self._select(n)]
+        cuts = np.sort(self.rng.integers(0, length + 1, (n, 2)), axis=1)
+        positions = np.arange(length)
+        from_second = (positions >= cuts[:, :1]) & (positions < cuts[:, 1:])
+        children = np.where(from_second, second, first)
+        children ^= (self.rng.random(children.shape) < self.mutation_rate).astype(np.uint8)
+        children_fitness = self.problem.evaluate_batch(children)
+        self.population = np.concatenate([self.population, children])
+        self.fitness = np.concatenate([self.fitness, children_fitness])
+        self._sort()
+        size = len(self.population) - n
+        self.population, self.fitness = self.population[:size], self.fitness[:size]
+
+    def emigrants(self, n):
+        return self.population[:n].copy(), self.fitness[:n].copy()
+
+    def immigrate(self, genomes, fitness):
+        # immigrants take the place of the worst individuals
+        if len(genomes):
+            self.population[-len(genomes):] = genomes
+            self.fitness[-len(genomes):] = fitness
+            self._sort()
+
+    def evolve(self, generations, immigrants, migrants):
+        # runs an epoch: receives the immigrants, evolves, returns (emigrants, [(best fitness, calls)] per generation)
+        self.immigrate(*immigrants)
+        history = []
+        for _ in range(generations):
+            self.generation()
+            history.append((float(self.fitness[0]), self.problem.calls))
+        return self.emigrants(migrants), history
+
+
+def _island_process(connection, config):
+    island = Island(**config)
+    connection.send(island.problem.calls)
+    while True:
+        message = connection.recv()
+        if message is None:
+            connection.send((island.population[0], float(island.fitness[0])))
+            connection.close()
+            return
+        connection.send(island.evolve(*message))
+
+
+class IslandModel:
+    def __init__(self, problem_size, num_islands=4, population_size=50, offspring_size=100, genome_length=1000,
+                 mutation_rate=0.001, tournament_size=2, migration_interval=10, migrants=2, topology="ring",
+                 seed=None, parallel=True):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"unknown topology {topology!r}, expected one of {TOPOLOGIES}")
+        self.num_islands = num_islands
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.topology = topology
+        self.parallel = parallel
+        self.rng = np.random.default_rng(seed)
+        seeds = self.rng.integers(0, 2**32, num_islands)
+        self.configs = [
+            dict(problem_size=problem_size, population_size=population_size, offspring_size=offspring_size,
+                 genome_length=genome_length, mutation_rate=mutation_rate, tournament_size=tournament_size,
+                 seed=int(s))
+            for s in seeds
+        ]
+
+    def destinations(self):
+        # island receiving the emigrants of every island for the next epoch
+        if self.topology == "ring":
+            return [(i + 1) % self.num_islands for i in range(self.num_islands)]
+        targets = []
+        for i in range(self.num_islands):
+            others = [j for j in range(self.num_islands) if j != i]
+            targets.append(int(self.rng.choice(others)) if others else i)
+        return targets
+
+    def _route(self, emigrants):
+        inbox = [[] for _ in range(self.num_islands)]
+        for source, target in enumerate(self.destinations()):
+            inbox[target].append(emigrants[source])
+        length = self.configs[0]["genome_length"]
+        return [
+            (np.concatenate([g for g, _ in mail]) if mail else np.empty((0, length), dtype=np.uint8),
+             np.concatenate([f for _, f in mail]) if mail else np.empty(0))
+            for mail in inbox
+        ]
+
+    def run(self, generations):
+        # returns best genome, best fitness, total calls and the history [(generation, best fitness, calls)]
+        if self.parallel:
+            connections, processes = [], []
+            for config in self.configs:
+                parent, child = mp.Pipe()
+                process = mp.Process(target=_island_process, args=(child, config), daemon=True)
+                process.start()
+                connections.append(parent)
+                processes.append(process)
+            initial_calls = sum(c.recv() for c in connections)
+
+            def epoch(n, inbox):
+                for connection, immigrants in zip(connections, inbox):
+                    connection.send((n, immigrants, self.migrants))
+                return [connection.recv() for connection in connections]
+        else:
+            islands = [Island(**config) for config in self.configs]
+            initial_calls = sum(island.problem.calls for island in islands)
+
+            def epoch(n, inbox):
+                return [island.evolve(n, immigrants, self.migrants) for island, immigrants in zip(islands, inbox)]
+
+        start = time.perf_counter()
+        history = []
+        length = self.configs[0]["genome_length"]
+        inbox = [(np.empty((0, length), dtype=np.uint8), np.empty(0))] * self.num_islands
+        try:
+            done = 0
+            while done < generations:
+                n = min(self.migration_interval, generations - done)
+                results = epoch(n, inbox)
+                for g in range(n):
+                    best = max(h[g][0] for _, h in results)
+                    calls = sum(h[g][1] for _, h in results)
+                    history.append((done + g + 1, best, calls))
+                inbox = self._route([emigrants for emigrants, _ in results])
+                done += n
+            if self.parallel:
+                finals = []
+                for connection in connections:
+                    connection.send(None)
+                    finals.append(connection.recv())
+            else:
+                finals = [(island.population[0], float(island.fitness[0])) for island in islands]
+        finally:
+            if self.parallel:
+                for process in processes:
+                    process.join(timeout=5)
+                    if process.is_alive():
+                        process.terminate()
+
+        best_genome, best_fitness = max(finals, key=lambda f: f[1])
+        return {
+            "best_genome": best_genome,
+            "best_fitness": best_fitness,
+            "calls": history[-1][2] if history else initial_calls,
+            "history": history,
+            "seconds": time.perf_counter() - start,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="lab9 island model GA")
+    parser.add_argument("--problem", type=int, default=10, help="problem instance a of make_problem")
+    parser.add_argument("--islands", type=int, default=4)
+    parser.add_argument("--population", type=int, default=50)
+    parser.add_argument("--offspring", type=int, default=100)
+    parser.add_argument("--generations", type=int, default=200)
+    parser.add_argument("--mutation-rate", type=float, default=0.001)
+    parser.add_argument("--interval", type=int, default=10, help="generations between migrations")
+    parser.add_argument("--migrants", type=int, default=2)
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="ring")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--sequential", action="store_true", help="run the islands one after the other in this process")
+    args = parser.parse_args(argv)
+
+    model = IslandModel(args.problem, args.islands, args.population, args.offspring, mutation_rate=args.mutation_rate,
+                        migration_interval=args.interval, migrants=args.migrants, topology=args.topology,
+                        seed=args.seed, parallel=not args.sequential)
+    result = model.run(args.generations)
+    for generation, best, calls in result["history"][args.interval - 1 :: args.interval]:
+        print(f"generation {generation:4d}: best fitness {best:.2%}, {calls} calls")
+    print(f"best fitness {result['best_fitness']:.2%} with {result['calls']} calls in {result['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,12 @@
 # https://github.com/squillero/computational-intelligence
 # Free for personal or classroom use; see 'LICENSE.md' for details.
 
+import hashlib
+import sys
 from abc import abstractmethod
+from collections import OrderedDict
+
+import numpy as np
 
 
 class AbstractProblem:
@@ -22,13 +27,123 @@ class AbstractProblem:
     def onemax(genome):
         return sum(bool(g) for g in genome)
 
-    def __call__(self, genome):
-        self._calls += 1
-        fitnesses = sorted((AbstractProblem.onemax(genome[s :: self.x]) for s in range(self.x)), reverse=True)
+    @staticmethod
+    def fitness_from_counts(counts, length):
+        # counts[s] is the onemax of genome[s::x]
+        fitnesses = sorted(counts, reverse=True)
         val = sum(f for f in fitnesses if f == fitnesses[0]) - sum(
             f * (0.1 ** (k + 1)) for k, f in enumerate(f for f in fitnesses if f < fitnesses[0])
         )
-        return val / len(genome)
+        return val / length
+
+    def __call__(self, genome):
+        self._calls += 1
+        counts = [AbstractProblem.onemax(genome[s :: self.x]) for s in range(self.x)]
+        return AbstractProblem.fitness_from_counts(counts, len(genome))
+
+    def evaluate_batch(self, population, packed_length=None):
+        # population: 2D array, one genome per row, or the rows of np.packbits(population, axis=1)
+        # when packed_length (the genome length) is given. Returns the same values as calling self on each row.
+        population = np.asarray(population)
+        if packed_length is not None:
+            population = np.unpackbits(population.astype(np.uint8), axis=1, count=packed_length)
+        genomes, length = population.shape
+        self._calls += genomes
+        return _fitness_from_counts(_residue_counts(population != 0, self.x), length)
+
+
+class IncrementalFitness:
+    # Keeps a genome with the onemax of each residue class s mod x, so that after changing a few bits the
+    # fitness costs O(changes + x log x) instead of a pass over the whole genome. Every fitness it returns
+    # counts as one call of the problem, as if the genome had been evaluated from scratch.
+    def __init__(self, problem, genome):
+        self.problem = problem
+        self.genome = np.array(genome) != 0
+        self.counts = _residue_counts(self.genome[np.newaxis], problem.x)[0].tolist()
+        self.fitness = self._evaluate()
+
+    def _evaluate(self):
+        self.problem._calls += 1
+        return AbstractProblem.fitness_from_counts(self.counts, len(self.genome))
+
+    def copy(self):
+        clone = object.__new__(IncrementalFitness)
+        clone.problem = self.problem
+        clone.genome = self.genome.copy()
+        clone.counts = list(self.counts)
+        clone.fitness = self.fitness
+        return clone
+
+    def _set(self, index, value):
+        if self.genome[index] != value:
+            self.genome[index] = value
+            self.counts[index % self.problem.x] += 1 if value else -1
+
+    def update(self, indices, values):
+        # sets genome[indices] = values, in order, and returns the new fitness
+        for index, value in zip(indices, values):
+            self._set(int(index), bool(value))
+        self.fitness = self._evaluate()
+        return self.fitness
+
+    def flip(self, indices):
+        # flips the bits at indices, in order, and returns the new fitness
+        for index in indices:
+            index = int(index)
+            self._set(index, not self.genome[index])
+        self.fitness = self._evaluate()
+        return self.fitness
+
+    def crossover(self, other, segments):
+        # child of self taking from other the bits selected by segments (slices or index arrays), scored from
+        # the counts of self and the bits where the two parents differ inside the segments
+        child = self.copy()
+        positions = np.arange(len(self.genome))
+        x = self.problem.x
+        for segment in segments:
+            indices = positions[segment]
+            changed = indices[child.genome[indices] != other.genome[indices]]
+            gained = np.where(other.genome[changed], 1, -1)
+            for s, delta in enumerate(np.bincount(changed % x, weights=gained, minlength=x).tolist()):
+                child.counts[s] += int(delta)
+            child.genome[changed] = other.genome[changed]
+        child.fitness = child._evaluate()
+        return child
+
+
+def _residue_counts(bits, x):
+    # onemax of genome[s::x] for every s, for every row of a boolean (genomes, length) array
+    genomes, length = bits.shape
+    padded = np.zeros((genomes, -(-length // x) * x), dtype=np.int32)
+    padded[:, :length] = bits
+    return padded.reshape(genomes, -1, x).sum(axis=1)
+
+
+def _float_sum(total, compensation, term):
+    # one step of the builtin sum() on floats: plain addition, Neumaier compensated from Python 3.12
+    new_total = total + term
+    if sys.version_info >= (3, 12):
+        compensation = compensation + np.where(
+            np.abs(total) >= np.abs(term), (total - new_total) + term, (term - new_total) + total
+        )
+    return new_total, compensation
+
+
+def _fitness_from_counts(counts, length):
+    # vectorized AbstractProblem.__call__ from the residue class counts, same float operations in the same order
+    fitnesses = -np.sort(-counts, axis=1)
+    best = fitnesses[:, :1]
+    top = (fitnesses == best).sum(axis=1) * best[:, 0]
+    penalty = np.zeros(len(counts))
+    compensation = np.zeros(len(counts))
+    weights = [0.1 ** (k + 1) for k in range(counts.shape[1])]
+    # the values below the best come right after the n equal to it, so their k is position - n
+    below = fitnesses < best
+    k = np.cumsum(below, axis=1) - 1
+    for position in range(counts.shape[1]):
+        term = np.where(below[:, position], fitnesses[:, position] * np.take(weights, k[:, position]), 0.0)
+        penalty, compensation = _float_sum(penalty, compensation, term)
+    return (top - (penalty + compensation)) / length
 
 
 def make_problem(a):
@@ -39,3 +154,91 @@ def make_problem(a):
             return a
 
     return Problem()
+
+
+class CachedProblem(AbstractProblem):
+    # Wraps a problem with a size bounded LRU cache of fitness values. Genomes are keyed by a 128 bit
+    # hash of their packed bits, only cache misses reach the wrapped problem and count as calls.
+    def __init__(self, problem, maxsize=1 << 16):
+        super().__init__()
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.problem = problem
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def x(self):
+        return self.problem.x
+
+    @property
+    def calls(self):
+        return self.problem.calls
+
+    @staticmethod
+    def key(genome):
+        bits = np.asarray(genome) != 0
+        return hashlib.blake2b(np.packbits(bits).tobytes() + len(bits).to_bytes(4, "little"), digest_size=16).digest()
+
+    def _lookup(self, key):
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def _store(self, key, value):
+        self.misses += 1
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def __call__(self, genome):
+        key = CachedProblem.key(genome)
+        value = self._lookup(key)
+        if value is None:
+            value = self.problem(genome)
+            self._store(key, value)
+        return value
+
+    def evaluate_batch(self, population, packed_length=None):
+        population = np.asarray(population)
+        if packed_length is not None:
+            population = np.unpackbits(population.astype(np.uint8), axis=1, count=packed_length)
+        keys = [CachedProblem.key(genome) for genome in population]
+        values = np.empty(len(keys))
+        pending = {}  # key -> rows, genomes missing from the cache are evaluated once even if repeated
+        for row, key in enumerate(keys):
+            if key in pending:
+                pending[key].append(row)
+                self.hits += 1
+                continue
+            value = self._lookup(key)
+            if value is None:
+                pending[key] = [row]
+            else:
+                values[row] = value
+        if pending:
+            first_rows = [rows[0] for rows in pending.values()]
+            fresh = self.problem.evaluate_batch(population[first_rows])
+            for (key, rows), value in zip(pending.items(), fresh):
+                values[rows] = value
+                self._store(key, float(value))
+        return values
+
+    def cache_info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+        }
+
+
+def make_cached_problem(a, maxsize=1 << 16):
+    return CachedProblem(make_problem(a), maxsize)
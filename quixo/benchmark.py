@@ -0,0 +1,176 @@
+'''
+Micro benchmarks for the Quixo search backends.
+
+    python benchmark.py alloc      # allocations per node, deepcopy + move vs make_move / unmake_move
+    python benchmark.py parallel   # speedup and search overhead of the root-parallel MinMaxFragger
+    python benchmark.py movegen    # moves generated per second by get_available_moves
+'''
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from copy import deepcopy
+from enhanced_game import EnhancedGame
+from bitboard_game import BitboardGame
+from players import MinMaxFragger
+
+BACKENDS = {'enhanced': EnhancedGame, 'bitboard': BitboardGame}
+
+
+def random_positions(backend, n: int = 20, plies: int = 12, seed: int = 42) -> list:
+    '''Fixed set of positions reached by random legal moves from the empty board'''
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < n:
+        game = backend()
+        player = 0
+        for _ in range(plies):
+            moves = game.get_available_moves(player)
+            game.move(*rng.choice(moves), player)
+            player = 1 - player
+        if game.check_winner() == -1:
+            positions.append((game, player))
+    return positions
+
+
+def _child_with_copy(game, tile, slide, player):
+    child = deepcopy(game)
+    child.move(tile, slide, player)
+
+
+def _child_in_place(game, tile, slide, player):
+    undo = game.make_move(tile, slide, player)
+    game.unmake_move(undo)
+
+
+def allocations_per_node(expand, positions) -> dict:
+    '''
+    Generates every child of every position with expand(game, tile, slide, player). For each child
+    tracemalloc reports the peak of the memory allocated on top of what was allocated before it.
+    '''
+    children = [(game, player, game.get_available_moves(player)) for game, player in positions]
+    nodes = sum(len(moves) for _, _, moves in children)
+    peak_bytes = 0
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for game, player, moves in children:
+            for tile, slide in moves:
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                expand(game, tile, slide, player)
+                _, peak = tracemalloc.get_traced_memory()
+                peak_bytes += peak - current
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    for game, player, moves in children:
+        for tile, slide in moves:
+            expand(game, tile, slide, player)
+    elapsed = time.perf_counter() - start
+    return {
+        'nodes': nodes,
+        'peak_bytes_per_node': peak_bytes / nodes,
+        'retained_bytes': retained,
+        'us_per_node': elapsed / nodes * 1e6,
+    }
+
+
+def bench_alloc(args) -> None:
+    for name, backend in BACKENDS.items():
+        positions = random_positions(backend, n=args.positions, seed=args.seed)
+        for label, expand in (('deepcopy + move', _child_with_copy), ('make/unmake', _child_in_place)):
+            r = allocations_per_node(expand, positions)
+            print(f"{name:9} {label:16} nodes={r['nodes']:6d}  peak bytes/node={r['peak_bytes_per_node']:8.1f}  "
+                  f"retained={r['retained_bytes']:6d}  {r['us_per_node']:7.2f} us/node")
+
+
+def moves_per_second(positions, repeat: int = 200) -> dict:
+    '''Calls get_available_moves for both players of every position repeat times'''
+    moves = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for game, _ in positions:
+            moves += len(game.get_available_moves(0)) + len(game.get_available_moves(1))
+    elapsed = time.perf_counter() - start
+    calls = repeat * len(positions) * 2
+    return {'moves_per_s': moves / elapsed, 'us_per_call': elapsed / calls * 1e6}
+
+
+def bench_movegen(args) -> None:
+    for name, backend in BACKENDS.items():
+        positions = random_positions(backend, n=args.positions, seed=args.seed)
+        r = moves_per_second(positions, args.repeat)
+        print(f"{name:9} {r['moves_per_s']:12,.0f} moves/s  {r['us_per_call']:6.2f} us/call")
+
+
+def parallel_speedup(backend, positions, depth: int, workers: int) -> dict:
+    '''Searches every position serially and with root splitting over workers processes'''
+    serial = MinMaxFragger(0, depth, backend=backend)
+    parallel = MinMaxFragger(0, depth, backend=backend, workers=workers)
+    try:
+        parallel.board.set_board(positions[0][0].get_board())
+        parallel.search(1)  # start the worker processes outside of the measure
+        timings = {'serial': [0.0, 0], 'parallel': [0.0, 0]}
+        mismatches = 0
+        for game, player in positions:
+            values = []
+            for label, searcher in (('serial', serial), ('parallel', parallel)):
+                searcher.player = player
+                searcher.board.set_board(game.get_board())
+                searcher.pv, searcher.killers = [], []
+                nodes = searcher.nodes
+                start = time.perf_counter()
+                value, _ = searcher.search(depth)
+                timings[label][0] += time.perf_counter() - start
+                timings[label][1] += searcher.nodes - nodes
+                values.append(value)
+            mismatches += values[0] != values[1]
+    finally:
+        parallel.close()
+    (serial_time, serial_nodes), (parallel_time, parallel_nodes) = timings['serial'], timings['parallel']
+    return {
+        'serial_s': serial_time,
+        'parallel_s': parallel_time,
+        'speedup': serial_time / parallel_time,
+        'search_overhead': parallel_nodes / serial_nodes,  # nodes searched in parallel / nodes searched serially
+        'value_mismatches': mismatches,
+    }
+
+
+def bench_parallel(args) -> None:
+    backend = BACKENDS[args.backend]
+    positions = random_positions(backend, n=args.positions, seed=args.seed)
+    r = parallel_speedup(backend, positions, args.depth, args.workers)
+    print(f"depth {args.depth}, {args.workers} workers: serial {r['serial_s']:.2f}s, parallel {r['parallel_s']:.2f}s, "
+          f"speedup x{r['speedup']:.2f}, search overhead x{r['search_overhead']:.2f}, value mismatches {r['value_mismatches']}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    alloc = sub.add_parser('alloc', help='allocations per node of deepcopy + move vs make/unmake')
+    alloc.add_argument('--positions', type=int, default=20)
+    alloc.add_argument('--seed', type=int, default=42)
+    alloc.set_defaults(func=bench_alloc)
+    parallel = sub.add_parser('parallel', help='speedup and search overhead of the root-parallel search')
+    parallel.add_argument('--depth', type=int, default=3)
+    parallel.add_argument('--workers', type=int, default=os.cpu_count())
+    parallel.add_argument('--backend', choices=BACKENDS, default='bitboard')
+    parallel.add_argument('--positions', type=int, default=10)
+    parallel.add_argument('--seed', type=int, default=42)
+    parallel.set_defaults(func=bench_parallel)
+    movegen = sub.add_parser('movegen', help='moves generated per second')
+    movegen.add_argument('--positions', type=int, default=50)
+    movegen.add_argument('--repeat', type=int, default=200)
+    movegen.add_argument('--seed', type=int, default=42)
+    movegen.set_defaults(func=bench_movegen)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+from game import Game, Move, Player
+from enhanced_game import available_moves
+import numpy as np
+
+# The board is stored as two 25-bit integers, one per player. Bit (row * 5 + col)
+# is set when the player owns that cell, which is the same indexing used by
+# board.flatten() and by the permutations in ALL_SYMMETRIES.
+
+FULL_MASK = (1 << 25) - 1
+
+
+def _bit(row: int, col: int) -> int:
+    return 1 << (row * 5 + col)
+
+
+# win lines in the same order Game.check_winner scans them: rows, columns, diagonals
+WIN_LINES = (
+    [sum(_bit(r, c) for c in range(5)) for r in range(5)]
+    + [sum(_bit(r, c) for r in range(5)) for c in range(5)]
+    + [sum(_bit(i, i) for i in range(5)), sum(_bit(i, 4 - i) for i in range(5))]
+)
+
+BORDER_TILES = [(r, c) for r in range(5) for c in range(5) if r in (0, 4) or c in (0, 4)]
+
+
+def _destination(row: int, col: int, slide: Move) -> tuple[int, int]:
+    if slide == Move.TOP:
+        return 0, col
+    if slide == Move.BOTTOM:
+        return 4, col
+    if slide == Move.LEFT:
+        return row, 0
+    return row, 4
+
+
+def _build_move_table():
+    '''
+    For each of the 44 legal (tile, slide) pairs precompute
+    (tile_bit, keep_mask, segment_mask, shift, destination_bit).
+    The cells in segment_mask move one step towards the taken tile, shift > 0 means >>, shift < 0 means <<.
+    '''
+    table = {}
+    for row, col in BORDER_TILES:
+        for slide in Move:
+            d_row, d_col = _destination(row, col, slide)
+            # a piece can't be pushed back into the same edge it was taken from
+            if (d_row, d_col) == (row, col):
+                continue
+            tile = row * 5 + col
+            dest = d_row * 5 + d_col
+            step = 1 if d_row == row else 5
+            if dest > tile:
+                segment = sum(1 << i for i in range(tile + step, dest + 1, step))
+                shift = step
+            else:
+                segment = sum(1 << i for i in range(dest, tile, step))
+                shift = -step
+            keep = FULL_MASK & ~(segment | (1 << tile))
+            table[(row, col), slide] = (1 << tile, keep, segment, shift, 1 << dest)
+    return table
+
+
+MOVE_TABLE = _build_move_table()
+
+
+class BitboardGame(Game):
+    '''
+    Same API as EnhancedGame (move, check_winner, get_available_moves, set_board, get_board, state_from_board)
+    but the state is two integers instead of a numpy array, so it is cheap to copy and to update.
+    '''
+
+    def __init__(self):
+        self._bits = [0, 0]
+        self.current_player_idx = 1
+
+    @property
+    def _board(self) -> np.ndarray:
+        board = np.ones(25, dtype=np.int16) * -1
+        for player in (0, 1):
+            bits = self._bits[player]
+            board[[i for i in range(25) if bits >> i & 1]] = player
+        return board.reshape(5, 5)
+
+    @_board.setter
+    def _board(self, board: np.ndarray) -> None:
+        flat = np.asarray(board).flatten()
+        self._bits = [
+            sum(1 << i for i in range(25) if flat[i] == 0),
+            sum(1 << i for i in range(25) if flat[i] == 1),
+        ]
+
+    @classmethod
+    def from_bits(cls, x_bits: int, o_bits: int) -> 'BitboardGame':
+        game = cls()
+        game._bits = [x_bits, o_bits]
+        return game
+
+    @property
+    def bits(self) -> tuple[int, int]:
+        return self._bits[0], self._bits[1]
+
+    def __deepcopy__(self, memo):
+        game = BitboardGame.from_bits(self._bits[0], self._bits[1])
+        game.current_player_idx = self.current_player_idx
+        return game
+
+    def get_board(self) -> np.ndarray:
+        return self._board
+
+    def set_board(self, board: np.ndarray) -> None:
+        self._board = board
+
+    def set_state(self, state):
+        (Xs, Os), _ = state
+        self._bits = [
+            sum(1 << i for i, v in enumerate(Xs) if v),
+            sum(1 << i for i, v in enumerate(Os) if v),
+        ]
+
+    def state_from_board(self, player: int):
+        Xs = tuple(bool(self._bits[0] >> i & 1) for i in range(25))
+        Os = tuple(bool(self._bits[1] >> i & 1) for i in range(25))
+        return (Xs, Os), player
+
+    def check_winner(self) -> int:
+        '''Check the winner. Returns the player ID of the winner if any, otherwise returns -1'''
+        x_bits, o_bits = self._bits
+        for line in WIN_LINES:
+            if x_bits & line == line:
+                return 0
+            if o_bits & line == line:
+                return 1
+        return -1
+
+    def move(self, from_pos: tuple[int, int], slide: Move, player_id: int) -> bool:
+        '''Perform a move, from_pos is in the (X, Y) format as in Game'''
+        if player_id not in (0, 1):
+            return False
+        entry = MOVE_TABLE.get(((from_pos[1], from_pos[0]), slide))
+        if entry is None:
+            return False  # not a border cell or not an acceptable slide
+        tile, keep, segment, shift, dest = entry
+        bits = self._bits
+        opponent = 1 - player_id
+        if bits[opponent] & tile:
+            return False  # the cell belongs to the opponent
+        mine = bits[player_id]
+        theirs = bits[opponent]
+        if shift > 0:
+            mine = (mine & keep) | ((mine & segment) >> shift) | dest
+            theirs = (theirs & keep) | ((theirs & segment) >> shift)
+        else:
+            mine = (mine & keep) | ((mine & segment) << -shift) | dest
+            theirs = (theirs & keep) | ((theirs & segment) << -shift)
+        bits[player_id] = mine
+        bits[opponent] = theirs
+        return True
+
+    def make_move(self, from_pos: tuple[int, int], slide: Move, player_id: int):
+        '''In place move for the search, returns the undo record for unmake_move or None if the move is not acceptable'''
+        undo = self._bits[0], self._bits[1]
+        if not self.move(from_pos, slide, player_id):
+            return None
+        return undo
+
+    def unmake_move(self, undo) -> None:
+        '''Takes back a move done with make_move'''
+        self._bits[0], self._bits[1] = undo
+
+    def get_available_moves(self, player: int) -> tuple[tuple[tuple[int, int], Move], ...]:
+        '''Same precomputed move lists as EnhancedGame.get_available_moves'''
+        return available_moves(self._bits[0], self._bits[1], player)
+
+    def play(self, player1: Player, player2: Player, max_plies: int = None) -> int:
+        '''Play the game. Returns the winning player, -1 when max_plies moves were played without a winner'''
+        players = [player1, player2]
+        winner = -1
+        plies = 0
+        while winner < 0:
+            if max_plies is not None and plies >= max_plies:
+                return -1
+            plies += 1
+            self.current_player_idx += 1
+            self.current_player_idx %= len(players)
+            ok = False
+            while not ok:
+                from_pos, slide = players[self.current_player_idx].make_move(self)
+                ok = self.move(from_pos, slide, self.current_player_idx)
+            winner = self.check_winner()
+        return winner
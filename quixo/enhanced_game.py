@@ -17,6 +17,7 @@ MIRROR_ROTATION_180_DEGREES = MIRROR_IMAGE[CLOCKWISE_ROTATION_180_DEGREES]
 MIRROR_ROTATION_270_DEGREES = MIRROR_IMAGE[CLOCKWISE_ROTATION_270_DEGREES]
 ALL_SYMMETRIES = [CLOCKWISE_ROTATION_90_DEGREES, CLOCKWISE_ROTATION_180_DEGREES, CLOCKWISE_ROTATION_270_DEGREES, MIRROR_ROTATION_90_DEGREES, MIRROR_ROTATION_180_DEGREES, MIRROR_ROTATION_270_DEGREES, MIRROR_IMAGE]
 ALLOWED_SLIDES = [Move.TOP,Move.LEFT,Move.BOTTOM,Move.RIGHT]
+POWERS_OF_TWO = 1 << np.arange(25, dtype=np.int64)
 
 class EnhancedGame(Game):
     def __init__(self):
@@ -37,6 +38,12 @@ class EnhancedGame(Game):
         key = tuple(map(tuple, (Xs, Os))), player
         return key
 
+    @property
+    def bits(self) -> tuple[int, int]:
+        """The board as two 25-bit integers (player 0, player 1), bit row * 5 + col, as in BitboardGame"""
+        board = self._board.ravel()
+        return int(POWERS_OF_TWO[board == 0].sum()), int(POWERS_OF_TWO[board == 1].sum())
+
     def board_from_state(state):
         board = np.ones(25, dtype=np.uint8) * -1
         Xs_Os,player = state
@@ -57,6 +64,49 @@ class EnhancedGame(Game):
                 self._board[(from_pos[1], from_pos[0])] = deepcopy(prev_value)
         return acceptable
 
+    def make_move(self, from_pos: tuple[int, int], slide: Move, player_id: int):
+        '''
+        In place version of move for the search: no copy of the board is made, the returned undo
+        record (row, col, slide, previous value) restores the position with unmake_move.
+        Returns None if the move is not acceptable.
+        '''
+        if player_id not in (0, 1):
+            return None
+        col, row = from_pos
+        if slide not in ACCEPTABLE_SLIDES.get((row, col), ()):
+            return None  # not in the border or not an acceptable slide
+        board = self._board
+        prev_value = int(board[row, col])
+        if prev_value != -1 and prev_value != player_id:
+            return None  # the cell belongs to the opponent
+        if slide == Move.RIGHT:
+            board[row, col:4] = board[row, col + 1:]
+            board[row, 4] = player_id
+        elif slide == Move.LEFT:
+            board[row, 1:col + 1] = board[row, :col]
+            board[row, 0] = player_id
+        elif slide == Move.BOTTOM:
+            board[row:4, col] = board[row + 1:, col]
+            board[4, col] = player_id
+        else:
+            board[1:row + 1, col] = board[:row, col]
+            board[0, col] = player_id
+        return row, col, slide, prev_value
+
+    def unmake_move(self, undo) -> None:
+        '''Takes back a move done with make_move'''
+        row, col, slide, prev_value = undo
+        board = self._board
+        if slide == Move.RIGHT:
+            board[row, col + 1:] = board[row, col:4]
+        elif slide == Move.LEFT:
+            board[row, :col] = board[row, 1:col + 1]
+        elif slide == Move.BOTTOM:
+            board[row + 1:, col] = board[row:4, col]
+        else:
+            board[:row, col] = board[1:row + 1, col]
+        board[row, col] = prev_value
+
     def take(self, from_pos: tuple[int, int], player_id: int) -> bool:
         """Checks that {from_pos} is in the border and marks the cell with {player_id}"""
         row, col = from_pos
@@ -71,61 +121,106 @@ class EnhancedGame(Game):
     @staticmethod
     def acceptable_slides(from_position: tuple[int, int]):
         """When taking a piece from {from_position} returns the possible moves (slides)"""
-        acceptable_slides = [Move.BOTTOM, Move.TOP, Move.LEFT, Move.RIGHT]
-        axis_0 = from_position[0]    # axis_0 = 0 means uppermost row
-        axis_1 = from_position[1]    # axis_1 = 0 means leftmost column
-
-        if axis_0 == 0:  # can't move upwards if in the top row...
-            acceptable_slides.remove(Move.TOP)
-        elif axis_0 == 4:
-            acceptable_slides.remove(Move.BOTTOM)
-
-        if axis_1 == 0:
-            acceptable_slides.remove(Move.LEFT)
-        elif axis_1 == 4:
-            acceptable_slides.remove(Move.RIGHT)
-        return acceptable_slides
+        return ACCEPTABLE_SLIDES.get(from_position, ())
 
     def slide(self, from_pos: tuple[int, int], slide: Move) -> bool:
         '''Slide the other pieces'''
         if slide not in self.acceptable_slides(from_pos):
             return False  # consider raise ValueError('Invalid argument value')
         axis_0, axis_1 = from_pos
-        # np.roll performs a rotation of the element of a 1D ndarray
+        # np.roll performs a rotation of the element of a 1D ndarray, only the
+        # segment between the taken piece and the border it is pushed into moves
         if slide == Move.RIGHT:
-            self._board[axis_0] = np.roll(self._board[axis_0], -1)
+            self._board[axis_0, axis_1:] = np.roll(self._board[axis_0, axis_1:], -1)
         elif slide == Move.LEFT:
-            self._board[axis_0] = np.roll(self._board[axis_0], 1)
+            self._board[axis_0, :axis_1 + 1] = np.roll(self._board[axis_0, :axis_1 + 1], 1)
         elif slide == Move.BOTTOM:
-            self._board[:, axis_1] = np.roll(self._board[:, axis_1], -1)
+            self._board[axis_0:, axis_1] = np.roll(self._board[axis_0:, axis_1], -1)
         elif slide == Move.TOP:
-            self._board[:, axis_1] = np.roll(self._board[:, axis_1], 1)
+            self._board[:axis_0 + 1, axis_1] = np.roll(self._board[:axis_0 + 1, axis_1], 1)
         return True
     
-    def get_available_moves(self,player: int) -> list[tuple[tuple[int, int], Move]]:
-        available_moves = []
-        ALL_INDICES = [0,1,2,3,4]
-        BORDER_INDICES = [0,4]
-        BORDER_CORNERS = list(product(ALL_INDICES, BORDER_INDICES))
-        BORDER_EDGES = list(product(BORDER_INDICES, ALL_INDICES))
-        EMPTY_POSITIONS = set(BORDER_CORNERS) | set(BORDER_EDGES)
-        IDENTICAL_BOARD_SYMMETRIES = []
-        original_board = self.get_board().flatten()
-        for sym in ALL_SYMMETRIES:
-            board = original_board[sym]
-            if (original_board == board).all():
-                IDENTICAL_BOARD_SYMMETRIES.append(sym)
-        
-        while EMPTY_POSITIONS:
-            row, col = EMPTY_POSITIONS.pop()
-            if self._board[row, col] == -1 or self._board[row, col] == player: 
-                for move in self.acceptable_slides((row,col)):
-                    available_moves.append(((col, row), move))
-            else:
-                continue
+    def get_available_moves(self,player: int) -> tuple[tuple[tuple[int, int], Move], ...]:
+        """
+        Moves of {player}, skipping the ones that are equivalent by a symmetry of the board.
+        The result is a shared precomputed tuple, don't modify it.
+        """
+        x_bits, o_bits = self.bits
+        return available_moves(x_bits, o_bits, player)
+
+
+def _acceptable_slides(from_position: tuple[int, int]) -> tuple[Move, ...]:
+    slides = [Move.BOTTOM, Move.TOP, Move.LEFT, Move.RIGHT]
+    if from_position[0] == 0:  # can't move upwards if in the top row...
+        slides.remove(Move.TOP)
+    elif from_position[0] == 4:
+        slides.remove(Move.BOTTOM)
+    if from_position[1] == 0:
+        slides.remove(Move.LEFT)
+    elif from_position[1] == 4:
+        slides.remove(Move.RIGHT)
+    return tuple(slides)
+
+
+# border cells in row major order, the order moves are generated in
+BORDER_POSITIONS = [(row, col) for row in range(5) for col in range(5) if row in (0, 4) or col in (0, 4)]
+# acceptable slides of every border cell, (row, col) -> slides; interior cells have none
+ACCEPTABLE_SLIDES = {(row, col): _acceptable_slides((row, col)) for row, col in BORDER_POSITIONS}
+BORDER_MASK = sum(1 << (row * 5 + col) for row, col in BORDER_POSITIONS)
+# moves from every border cell, in the ((X, Y), slide) format of Player.make_move
+MOVES_BY_POSITION = {(row, col): tuple(((col, row), slide) for slide in ACCEPTABLE_SLIDES[row, col]) for row, col in BORDER_POSITIONS}
+
+
+def _symmetry_tables():
+    """For every symmetry and every row of the source board, maps the 5 row bits to their permuted positions"""
+    tables = []
+    for sym in ALL_SYMMETRIES:
+        inverse = np.argsort(sym)
+        tables.append([
+            [sum(1 << int(inverse[r * 5 + k]) for k in range(5) if value >> k & 1) for value in range(32)]
+            for r in range(5)
+        ])
+    return tables
+
+
+SYMMETRY_TABLES = _symmetry_tables()
+
+
+def permute_bits(bits: int, table) -> int:
+    """Applies a symmetry (one entry of SYMMETRY_TABLES) to a bitboard, same as board.flatten()[sym]"""
+    return (table[0][bits & 31] | table[1][bits >> 5 & 31] | table[2][bits >> 10 & 31]
+            | table[3][bits >> 15 & 31] | table[4][bits >> 20 & 31])
+
+
+def invariant_symmetries(x_bits: int, o_bits: int) -> int:
+    """Bit i is set when ALL_SYMMETRIES[i] maps the board onto itself"""
+    mask = 0
+    for i, table in enumerate(SYMMETRY_TABLES):
+        if permute_bits(x_bits, table) == x_bits and permute_bits(o_bits, table) == o_bits:
+            mask |= 1 << i
+    return mask
+
+
+# move lists already built, keyed by the border cells of the opponent and the symmetries of the board
+_MOVES_CACHE = {}
+
+
+def available_moves(x_bits: int, o_bits: int, player: int) -> tuple[tuple[tuple[int, int], Move], ...]:
+    """Moves of {player} on the board given as bitboards, see EnhancedGame.get_available_moves"""
+    opponent_border = (o_bits if player == 0 else x_bits) & BORDER_MASK
+    symmetries = invariant_symmetries(x_bits, o_bits)
+    key = opponent_border | symmetries << 25
+    moves = _MOVES_CACHE.get(key)
+    if moves is None:
+        moves = []
+        skipped = set()
+        for row, col in BORDER_POSITIONS:
             index = row * 5 + col
-            for sym in IDENTICAL_BOARD_SYMMETRIES:
-                idx_pos = sym[index]
-                pos = idx_pos // 5, idx_pos % 5
-                EMPTY_POSITIONS.discard(pos)
-        return available_moves
+            if index in skipped or opponent_border >> index & 1:
+                continue
+            moves.extend(MOVES_BY_POSITION[row, col])
+            for i, sym in enumerate(ALL_SYMMETRIES):
+                if symmetries >> i & 1:
+                    skipped.add(int(sym[index]))
+        moves = _MOVES_CACHE[key] = tuple(moves)
+    return moves
@@ -0,0 +1,158 @@
+import numpy as np
+from game import Move
+
+# The 12 lines in the order Game.check_winner scans them: rows, columns, principal and secondary diagonal
+LINES = (
+    [[r * 5 + c for c in range(5)] for r in range(5)]
+    + [[r * 5 + c for r in range(5)] for c in range(5)]
+    + [[i * 5 + i for i in range(5)], [i * 5 + 4 - i for i in range(5)]]
+)
+# for every cell the lines it belongs to
+CELL_LINES = [[line for line, cells in enumerate(LINES) if cell in cells] for cell in range(25)]
+# (25, 12) incidence matrix used by the batched path
+LINE_MATRIX = np.array([[cell in cells for cells in LINES] for cell in range(25)], dtype=np.int16)
+
+
+def _term(a: int, b: int, edge: bool) -> float:
+    '''One addend of MinMaxFragger.evaluate, written with the very same float operations'''
+    val = a / 4 - b / 4
+    if a > b:
+        val += a*0.1
+    elif a < b:
+        val -= b*0.1
+    if edge:
+        val *= 1.5
+    return val
+
+
+# TERMS[edge][a][b] for a, b piece counts in 0..5
+TERMS = [[[_term(a, b, edge) for b in range(6)] for a in range(6)] for edge in (False, True)]
+TERMS_ARRAY = np.array(TERMS, dtype=np.float64)
+
+# The heuristic compares the pieces of a player in row i with the pieces of the same player in column i,
+# rows and columns 0 and 4 weighted 1.5, then the two players on each diagonal.
+# Each entry is (player of a, line of a, player of b, line of b, edge) in the order the addends are summed.
+SCORE_TERMS = (
+    [(p, r, p, 5 + r, r in (0, 4)) for r in range(5) for p in (0, 1)]
+    + [(0, 10, 1, 10, False), (0, 11, 1, 11, False)]
+)
+
+
+def _segment(row: int, col: int, slide: Move) -> list[int]:
+    '''Cells touched by a slide, from the taken tile to the cell where the piece is pushed in'''
+    if slide == Move.TOP:
+        return [r * 5 + col for r in range(row, -1, -1)]
+    if slide == Move.BOTTOM:
+        return [r * 5 + col for r in range(row, 5)]
+    if slide == Move.LEFT:
+        return [row * 5 + c for c in range(col, -1, -1)]
+    return [row * 5 + c for c in range(col, 5)]
+
+
+SEGMENTS = {
+    ((col, row), slide): _segment(row, col, slide)
+    for row in range(5) for col in range(5) if row in (0, 4) or col in (0, 4)
+    for slide in Move if len(_segment(row, col, slide)) > 1
+}
+
+
+def score_counts(counts: list[list[int]]) -> float:
+    '''MinMaxFragger.evaluate computed from the per-line piece counts of player 0 and player 1'''
+    x_counts, o_counts = counts
+    for line in range(12):
+        if x_counts[line] == 5:
+            return float('inf')
+        if o_counts[line] == 5:
+            return float('-inf')
+    evaluation = 0
+    for pa, la, pb, lb, edge in SCORE_TERMS:
+        evaluation += TERMS[edge][counts[pa][la]][counts[pb][lb]]
+    return evaluation
+
+
+def evaluate_boards(boards: np.ndarray) -> np.ndarray:
+    '''
+    Batched MinMaxFragger.evaluate: boards is an array of shape (n, 5, 5) or (n, 25) of -1 / 0 / 1 cells,
+    returns the n scores, bit-identical to the scalar heuristic (addends are summed in the same order).
+    '''
+    boards = np.asarray(boards).reshape(-1, 25)
+    x_counts = (boards == 0).astype(np.int16) @ LINE_MATRIX
+    o_counts = (boards == 1).astype(np.int16) @ LINE_MATRIX
+    counts = (x_counts, o_counts)
+
+    evaluation = np.zeros(len(boards), dtype=np.float64)
+    for pa, la, pb, lb, edge in SCORE_TERMS:
+        evaluation += TERMS_ARRAY[int(edge), counts[pa][:, la], counts[pb][:, lb]]
+
+    # the first complete line in scan order decides the winner, as in Game.check_winner
+    x_full = x_counts == 5
+    o_full = o_counts == 5
+    any_full = x_full | o_full
+    decided = any_full.any(axis=1)
+    first = any_full.argmax(axis=1)
+    rows = np.arange(len(boards))
+    evaluation[decided & x_full[rows, first]] = float('inf')
+    evaluation[decided & ~x_full[rows, first]] = float('-inf')
+    return evaluation
+
+
+class LineCounts:
+    '''
+    Piece counts of both players on the 12 lines, kept up to date while the search makes and
+    takes back moves: a slide only changes the cells between the taken tile and the border,
+    so only the lines through those cells are touched.
+    '''
+
+    def __init__(self):
+        self.cells = [-1] * 25
+        self.counts = [[0] * 12, [0] * 12]
+        self._history = []
+
+    def reset(self, board: np.ndarray) -> None:
+        self.cells = [int(v) for v in np.asarray(board).ravel()]
+        self.counts = [[0] * 12, [0] * 12]
+        for cell, value in enumerate(self.cells):
+            if value != -1:
+                for line in CELL_LINES[cell]:
+                    self.counts[value][line] += 1
+        self._history = []
+
+    def _set(self, cell: int, value: int) -> None:
+        old = self.cells[cell]
+        if old == value:
+            return
+        if old != -1:
+            for line in CELL_LINES[cell]:
+                self.counts[old][line] -= 1
+        if value != -1:
+            for line in CELL_LINES[cell]:
+                self.counts[value][line] += 1
+        self.cells[cell] = value
+
+    def push(self, from_pos: tuple[int, int], slide: Move, player_id: int) -> None:
+        '''Mirrors an (already validated) move on the counts'''
+        segment = SEGMENTS[from_pos, slide]
+        cells = self.cells
+        values = [cells[c] for c in segment]
+        self._history.append((segment, values))
+        for k in range(len(segment) - 1):
+            self._set(segment[k], values[k + 1])
+        self._set(segment[-1], player_id)
+
+    def pop(self) -> None:
+        '''Takes back the last move pushed'''
+        segment, values = self._history.pop()
+        for cell, value in zip(segment, values):
+            self._set(cell, value)
+
+    def winner(self) -> int:
+        x_counts, o_counts = self.counts
+        for line in range(12):
+            if x_counts[line] == 5:
+                return 0
+            if o_counts[line] == 5:
+                return 1
+        return -1
+
+    def score(self) -> float:
+        return score_counts(self.counts)
@@ -84,11 +84,15 @@ class Game(object):
             return self._board[0, -1]
         return -1
 
-    def play(self, player1: Player, player2: Player) -> int:
-        '''Play the game. Returns the winning player'''
+    def play(self, player1: Player, player2: Player, max_plies: int = None) -> int:
+        '''Play the game. Returns the winning player, -1 when max_plies moves were played without a winner'''
         players = [player1, player2]
         winner = -1
+        plies = 0
         while winner < 0:
+            if max_plies is not None and plies >= max_plies:
+                return -1
+            plies += 1
             self.current_player_idx += 1
             self.current_player_idx %= len(players)
             ok = False
@@ -5,9 +5,16 @@ from collections import defaultdict
 from tqdm.auto import tqdm
 import numpy as np
 import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 from itertools import product
 from enhanced_game import EnhancedGame
+from bitboard_game import BitboardGame
+from evaluation import LineCounts
+from rollout import random_playouts
+from solver import SolvedTable
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, REPLACE_DEPTH
 
 class RandomPlayer(Player):
     def __init__(self) -> None:
@@ -20,12 +27,13 @@ class RandomPlayer(Player):
 
 "noob player is like your average teamate when you are solo queuing in ranked, it sucks, but it can capitalize on a immediate win if he sees it"
 class NoobPlayer(Player):
-    def __init__(self,player) -> None:
+    def __init__(self,player, backend=EnhancedGame) -> None:
         super().__init__()
         self.player = player
+        self.backend = backend
 
     def make_move(self, game: 'Game') -> tuple[tuple[int, int], Move]:
-        g = EnhancedGame()
+        g = self.backend()
         moves = [Move.TOP, Move.BOTTOM, Move.LEFT, Move.RIGHT]
         l = [0,1,2,3,4]
         l2 = [0,4]
@@ -46,64 +54,307 @@ class NoobPlayer(Player):
 
 
 
+# one searcher per configuration in every worker process of a parallel MinMaxFragger, so that
+# transposition table and history survive from one move to the next
+_worker_searchers = {}
+
+
+def _search_root_moves(config, board, player, depth, moves, deadline):
+    searcher = _worker_searchers.get(config)
+    if searcher is None:
+        backend, tt_size, tt_policy, tt_symmetries = config
+        searcher = MinMaxFragger(player, depth, backend=backend, tt_size=tt_size, tt_policy=tt_policy, tt_symmetries=tt_symmetries)
+        _worker_searchers[config] = searcher
+    return searcher.search_root_moves(board, player, depth, moves, deadline)
+
+
+class SearchTimeout(Exception):
+    '''Raised inside the search tree when the time budget of the move is exhausted'''
+    pass
+
+
 class MinMaxFragger(Player):
-    def __init__(self, player: int, depth: int):
+    MAX_DEPTH = 32  # deepening limit when only a time budget is given
+
+    def __init__(self, player: int, depth: int = None, backend=EnhancedGame, tt_size: int = 0, tt_policy: str = REPLACE_DEPTH, tt_symmetries: bool = False, time_budget_ms: float = None, workers: int = 1):
+        '''
+        depth: fixed search depth, or the maximum depth when time_budget_ms is given
+        backend: the game class used for the search tree, EnhancedGame or BitboardGame
+        tt_size: number of transposition table slots, 0 disables the table
+        tt_policy: 'depth' (depth-preferred) or 'always' (always-replace)
+        tt_symmetries: key the table on the position canonical under the 8 board symmetries; off by default,
+            evaluate is not invariant under them and the cached scores of a mirrored position would be approximate
+        time_budget_ms: search with iterative deepening and return the best move of the deepest
+            iteration completed within this many milliseconds
+        workers: number of processes the root moves are split across, 1 searches in this process
+        '''
+        if depth is None and time_budget_ms is None:
+            raise ValueError('either depth or time_budget_ms must be given')
         self.player = player
         self.depth = depth
-        self.board = EnhancedGame()
-        self.initial_val = float('inf') if player == 0 else float('-inf')
+        self.time_budget_ms = time_budget_ms
+        self.board = backend()
+        self.tt = TranspositionTable(tt_size, tt_policy, tt_symmetries) if tt_size else None
+        self.workers = workers
+        self._pool = None
+        self._worker_config = (backend, tt_size, tt_policy, tt_symmetries)
+        self.nodes = 0
+        self.line_counts = LineCounts()  # incremental evaluation, same scores as evaluate()
+        # move ordering: principal variation of the previous iteration, killer moves per ply, history scores per player
+        self.pv = []
+        self.killers = []
+        self.history = [defaultdict(int), defaultdict(int)]
+        self.last_search = {}
+        self._deadline = None
+        self._root_move = None
+        self._child_pv = []
 
     def make_move(self, quixo_game: Game) -> tuple[tuple[int, int], Move]:
         self.board.set_board(quixo_game.get_board())
-        _, move = self.minimax(deepcopy(self.board), depth=self.depth, maximizing_player = self.player, evaluation_prev_node = self.initial_val)
-        return move
+        start = time.perf_counter()
+        start_nodes = self.nodes
+        self.killers = []
+        for history in self.history:  # age the history of the previous moves
+            for m in history:
+                history[m] //= 2
 
-    def minimax(self, quixo_game: EnhancedGame, depth: int, maximizing_player: int, evaluation_prev_node: float):
-        if depth == 0 or quixo_game.check_winner() != -1:
-            return self.evaluate(quixo_game), None
-
-        possible_moves = quixo_game.get_available_moves(maximizing_player)
-
-        if maximizing_player == 0:
-            max_eval = float('-inf')
-            best_move = None
-            for tile,move in possible_moves:
-                if max_eval == float('inf'):
-                    return max_eval, best_move
-                if max_eval >= evaluation_prev_node:
-                    return max_eval, best_move
-                
-                new_game = deepcopy(quixo_game)
-                ok = new_game.move(tile,move,0)
-                if not ok:
-                    print(tile, move)
-                    continue
-                evaluation, _ = self.minimax(new_game, depth - 1, 1, max_eval)
-                if evaluation > max_eval:
-                    max_eval = evaluation
-                    best_move = tile,move
-            return max_eval, best_move
+        if self.time_budget_ms is None:
+            self.pv = []
+            _, move = self.search(self.depth)
+            completed = self.depth
         else:
-            min_eval = float('inf')
-            best_move = None
-            for tile,move in possible_moves:
-                if min_eval == float('-inf'):
-                    return min_eval, best_move
-                if min_eval <= evaluation_prev_node:
-                    return min_eval, best_move
-                
-                new_game = deepcopy(quixo_game)
-                ok = new_game.move(tile,move,1)
-                if not ok:
-                    print(tile, move)
+            move, completed = self.iterative_deepening(start + self.time_budget_ms / 1000)
+
+        self.last_search = {
+            'depth': completed,
+            'nodes': self.nodes - start_nodes,
+            'time_ms': (time.perf_counter() - start) * 1000,
+        }
+        return move
+
+    def iterative_deepening(self, deadline: float):
+        '''Searches depth 1, 2, ... until the deadline, returns (best move, deepest completed depth)'''
+        max_depth = self.depth if self.depth is not None else self.MAX_DEPTH
+        self.pv = []
+        self._deadline = deadline
+        best_move = None
+        completed = 0
+        try:
+            for depth in range(1, max_depth + 1):
+                self._root_move = None
+                evaluation, move = self.search(depth)
+                best_move = move
+                completed = depth
+                if evaluation in (float('inf'), float('-inf')):
+                    break  # the game is decided, searching deeper won't change the outcome
+        except SearchTimeout:
+            if best_move is None:
+                # not even depth 1 finished: take the best root move seen so far, or any legal one
+                best_move = self._root_move or self.board.get_available_moves(self.player)[0]
+        finally:
+            self._deadline = None
+        return best_move, completed
+
+    def search(self, depth: int):
+        '''Searches the current board to the given depth, returns (evaluation, best move)'''
+        if self.workers > 1:
+            return self.parallel_search(depth)
+        return self.minimax(self.board, depth=depth, maximizing_player = self.player)
+
+    def parallel_search(self, depth: int):
+        '''
+        Root splitting: the ordered root moves are dealt round robin to the worker processes, each one
+        searches its share with its own alpha-beta window and transposition table. The best move is the
+        one with the best value, ties go to the move that comes first in the root ordering as in the serial search.
+        '''
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        moves = list(enumerate(self.order_moves(self.board.get_available_moves(self.player), 0, self.player)))
+        deadline = None
+        if self._deadline is not None:  # perf_counter is per process, the workers get a wall clock deadline
+            deadline = time.time() + (self._deadline - time.perf_counter())
+        board = self.board.get_board()
+        futures = [
+            self._pool.submit(_search_root_moves, self._worker_config, board, self.player, depth, moves[i::self.workers], deadline)
+            for i in range(min(self.workers, len(moves)))
+        ]
+        results = [f.result() for f in futures]
+        self.nodes += sum(nodes for _, _, nodes, _ in results)
+
+        best_eval, best_index = None, None
+        for evaluation, index, _, _ in results:
+            if index is None:
+                continue
+            if self.player == 0:
+                better = best_index is None or evaluation > best_eval or (evaluation == best_eval and index < best_index)
+            else:
+                better = best_index is None or evaluation < best_eval or (evaluation == best_eval and index < best_index)
+            if better:
+                best_eval, best_index = evaluation, index
+        if best_index is not None:
+            self._root_move = moves[best_index][1]
+        if any(timed_out for _, _, _, timed_out in results):
+            raise SearchTimeout()
+        self.pv = [self._root_move]
+        return best_eval, self._root_move
+
+    def search_root_moves(self, board: np.ndarray, player: int, depth: int, moves: list, deadline: float = None):
+        '''
+        Worker side of parallel_search: searches the given (index, move) root moves of board.
+        Returns (best evaluation, index of the best move, nodes searched, timed out).
+        '''
+        self.board.set_board(board)
+        self.line_counts.reset(self.board.get_board())
+        self.killers = []
+        start_nodes = self.nodes
+        if deadline is not None:
+            self._deadline = time.perf_counter() + (deadline - time.time())
+        alpha, beta = float('-inf'), float('inf')
+        best_eval, best_index = None, None
+        timed_out = False
+        try:
+            for index, (tile, move) in moves:
+                undo = self.board.make_move(tile, move, player)
+                if undo is None:
                     continue
-                evaluation, _ = self.minimax(new_game, depth - 1, 0, min_eval)
-                if evaluation < min_eval:
-                    min_eval = evaluation
-                    best_move = tile,move
-            return min_eval, best_move
+                self.line_counts.push(tile, move, player)
+                try:
+                    evaluation, _ = self.minimax(self.board, depth - 1, 1 - player, alpha, beta, ply=1)
+                finally:
+                    self.board.unmake_move(undo)
+                    self.line_counts.pop()
+                if player == 0:
+                    if best_index is None or evaluation > best_eval:
+                        best_eval, best_index = evaluation, index
+                    alpha = max(alpha, best_eval)
+                else:
+                    if best_index is None or evaluation < best_eval:
+                        best_eval, best_index = evaluation, index
+                    beta = min(beta, best_eval)
+                if alpha >= beta:
+                    break
+        except SearchTimeout:
+            timed_out = True
+        finally:
+            self._deadline = None
+        return best_eval, best_index, self.nodes - start_nodes, timed_out
+
+    def close(self) -> None:
+        '''Shuts down the worker processes of the parallel search'''
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def order_moves(self, possible_moves: list, ply: int, player: int, tt_move=None) -> list:
+        '''TT move or principal variation first, then killer moves of this ply, then by history score'''
+        first_move = tt_move
+        if first_move is None and ply < len(self.pv) and self.pv[ply] in possible_moves:
+            first_move = self.pv[ply]
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history[player]
+
+        def priority(m):
+            if m == first_move:
+                return 2, 0
+            if m in killers:
+                return 1, 0
+            return 0, history.get(m, 0)
+
+        ordered = sorted(possible_moves, key=priority, reverse=True)
+        if tt_move is not None and (not ordered or ordered[0] != tt_move):
+            # a symmetric twin of the TT move may have been pruned from the list, it is legal anyway
+            ordered.insert(0, tt_move)
+        return ordered
+
+    def _record_cutoff(self, move, ply: int, player: int, depth: int) -> None:
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self.history[player][move] += depth * depth
+
+    def minimax(self, quixo_game: EnhancedGame, depth: int, maximizing_player: int, alpha: float = float('-inf'), beta: float = float('inf'), ply: int = 0):
+        '''Alpha-beta search, player 0 maximizes and player 1 minimizes. Returns (evaluation, best move)'''
+        self.nodes += 1
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+        line_counts = self.line_counts
+        if ply == 0:
+            line_counts.reset(quixo_game.get_board())
+        if depth == 0 or line_counts.winner() != -1:
+            self._child_pv = []
+            return line_counts.score(), None
+
+        alpha_orig, beta_orig = alpha, beta
+        tt_move = None
+        if self.tt is not None:
+            key, sym = self.tt.key(*quixo_game.bits, maximizing_player)
+            entry = self.tt.probe(key, sym)
+            if entry is not None:
+                value, flag, stored_depth, tt_move = entry
+                if stored_depth >= depth and tt_move is not None:
+                    if flag == LOWER:
+                        alpha = max(alpha, value)
+                    elif flag == UPPER:
+                        beta = min(beta, value)
+                    if flag == EXACT or alpha >= beta:
+                        self._child_pv = [tt_move]
+                        if ply == 0:
+                            self.pv = self._child_pv
+                        return value, tt_move
+
+        possible_moves = self.order_moves(quixo_game.get_available_moves(maximizing_player), ply, maximizing_player, tt_move)
+
+        best_eval = float('-inf') if maximizing_player == 0 else float('inf')
+        best_move = None
+        best_line = []
+        for tile,move in possible_moves:
+            undo = quixo_game.make_move(tile,move,maximizing_player)
+            if undo is None:
+                continue
+            line_counts.push(tile, move, maximizing_player)
+            try:
+                evaluation, _ = self.minimax(quixo_game, depth - 1, 1 - maximizing_player, alpha, beta, ply + 1)
+            finally:
+                quixo_game.unmake_move(undo)
+                line_counts.pop()
+            if maximizing_player == 0:
+                improved = best_move is None or evaluation > best_eval
+            else:
+                improved = best_move is None or evaluation < best_eval
+            if improved:
+                best_eval = evaluation
+                best_move = tile,move
+                best_line = self._child_pv
+                if ply == 0:
+                    self._root_move = best_move
+            if maximizing_player == 0:
+                alpha = max(alpha, best_eval)
+            else:
+                beta = min(beta, best_eval)
+            if alpha >= beta:
+                self._record_cutoff((tile, move), ply, maximizing_player, depth)
+                break
+
+        # principal variation of this node, read by the parent and kept for the next iteration at the root
+        self._child_pv = [best_move] + best_line if best_move is not None else []
+        if ply == 0:
+            self.pv = self._child_pv
+
+        if self.tt is not None:
+            if best_eval <= alpha_orig:
+                flag = UPPER
+            elif best_eval >= beta_orig:
+                flag = LOWER
+            else:
+                flag = EXACT
+            self.tt.store(key, sym, best_eval, flag, depth, best_move)
+        return best_eval, best_move
 
     def evaluate(self, quixo_game: EnhancedGame) -> float:
+        '''Reference heuristic, the search uses the equivalent incremental LineCounts.score()'''
         # Check for a winner and return appropriate values
         winner = quixo_game.check_winner()
         if winner == 1:
@@ -111,26 +362,28 @@ class MinMaxFragger(Player):
         elif winner == 0:
             return float('inf')
         
+        board = quixo_game._board
+
         # Initialize lists for tracking row and column scores
         row_scores = []
         col_scores = []
 
         # Calculate scores for rows and columns
-        for i in range(quixo_game._board.shape[0]):
-            x_r = sum([1 for j in range(quixo_game._board.shape[1]) if quixo_game._board[i,j] == 0])
-            o_r = sum([1 for j in range(quixo_game._board.shape[1]) if quixo_game._board[i,j] == 1])
+        for i in range(board.shape[0]):
+            x_r = sum([1 for j in range(board.shape[1]) if board[i,j] == 0])
+            o_r = sum([1 for j in range(board.shape[1]) if board[i,j] == 1])
             row_scores.extend([x_r, o_r])
 
-            x_c = sum([1 for j in range(quixo_game._board.shape[1]) if quixo_game._board[j,i] == 0])
-            o_c = sum([1 for j in range(quixo_game._board.shape[1]) if quixo_game._board[j,i] == 1])
+            x_c = sum([1 for j in range(board.shape[1]) if board[j,i] == 0])
+            o_c = sum([1 for j in range(board.shape[1]) if board[j,i] == 1])
             col_scores.extend([x_c, o_c])
 
         # Calculate scores for diagonals
-        x_d1 = sum([1 for i in range(quixo_game._board.shape[0]) if quixo_game._board[i,i] == 0])
-        o_d1 = sum([1 for i in range(quixo_game._board.shape[0]) if quixo_game._board[i,i] == 1])
+        x_d1 = sum([1 for i in range(board.shape[0]) if board[i,i] == 0])
+        o_d1 = sum([1 for i in range(board.shape[0]) if board[i,i] == 1])
         
-        x_d2 = sum([1 for i in range(quixo_game._board.shape[0]) if quixo_game._board[i, -(i+1)] == 0])
-        o_d2 = sum([1 for i in range(quixo_game._board.shape[0]) if quixo_game._board[i, -(i+1)] == 1])
+        x_d2 = sum([1 for i in range(board.shape[0]) if board[i, -(i+1)] == 0])
+        o_d2 = sum([1 for i in range(board.shape[0]) if board[i, -(i+1)] == 1])
 
         # Initialize the evaluation value
         evaluation = 0
@@ -168,3 +421,151 @@ class MinMaxFragger(Player):
 
         # Return the final evaluation value
         return evaluation
+
+
+class MCTSNode:
+    '''Node of the MCTSPlayer tree, wins are counted for the player who made the move leading here'''
+    __slots__ = ('bits', 'player', 'move', 'parent', 'children', 'untried', 'visits', 'wins', 'winner')
+
+    def __init__(self, bits: tuple[int, int], player: int, move=None, parent: 'MCTSNode' = None):
+        self.bits = bits
+        self.player = player  # player to move
+        self.move = move
+        self.parent = parent
+        self.children = []
+        game = BitboardGame.from_bits(*bits)
+        self.winner = game.check_winner()
+        self.untried = list(game.get_available_moves(player)) if self.winner == -1 else []
+        self.visits = 0
+        self.wins = 0.0
+
+    def uct_child(self, exploration: float) -> 'MCTSNode':
+        log_visits = np.log(self.visits)
+        return max(self.children, key=lambda c: c.wins / c.visits + exploration * np.sqrt(log_visits / c.visits))
+
+
+class MCTSPlayer(Player):
+    def __init__(self, player: int, playouts: int = 20000, time_budget_ms: float = None, rollouts_per_leaf: int = 32, leaves_per_batch: int = 32, exploration: float = 1.4, max_rollout_plies: int = 200, seed: int = None):
+        '''
+        Monte Carlo Tree Search with UCT. Every iteration selects leaves_per_batch leaves (with virtual loss, so they
+        differ) and plays rollouts_per_leaf random games from each of them, all in one NumPy batch.
+        playouts: random games per move, ignored when time_budget_ms is given
+        time_budget_ms: keep searching until this many milliseconds have passed
+        max_rollout_plies: random games longer than this are counted as draws
+        The subtree of the move played is kept and reused at the next move.
+        '''
+        super().__init__()
+        self.player = player
+        self.playouts = playouts
+        self.time_budget_ms = time_budget_ms
+        self.rollouts_per_leaf = rollouts_per_leaf
+        self.leaves_per_batch = leaves_per_batch
+        self.exploration = exploration
+        self.max_rollout_plies = max_rollout_plies
+        self.rng = np.random.default_rng(seed)
+        self.root = None
+        self.last_search = {}
+
+    def _find_root(self, bits: tuple[int, int]) -> MCTSNode:
+        '''Reuses the subtree of the position reached after our last move and the opponent reply, if it was explored'''
+        if self.root is not None:
+            for child in self.root.children:
+                if child.bits == bits and child.player == self.player:
+                    child.parent = None
+                    return child
+        return MCTSNode(bits, self.player)
+
+    def _select(self, rollouts: int) -> MCTSNode:
+        node = self.root
+        while not node.untried and node.children:
+            node = node.uct_child(self.exploration)
+        if node.untried:
+            move = node.untried.pop(int(self.rng.integers(len(node.untried))))
+            game = BitboardGame.from_bits(*node.bits)
+            game.move(*move, node.player)
+            child = MCTSNode(game.bits, 1 - node.player, move, node)
+            node.children.append(child)
+            node = child
+        # virtual loss: count the visits now so the next selections of the batch go elsewhere
+        n = node
+        while n is not None:
+            n.visits += rollouts
+            n = n.parent
+        return node
+
+    def _backpropagate(self, node: MCTSNode, x_wins: int, o_wins: int, draws: int) -> None:
+        while node is not None:
+            node.wins += (x_wins if node.player == 1 else o_wins) + 0.5 * draws
+            node = node.parent
+
+    def make_move(self, game: 'Game') -> tuple[tuple[int, int], Move]:
+        start = time.perf_counter()
+        board = BitboardGame()
+        board.set_board(game.get_board())
+        self.root = self._find_root(board.bits)
+        if not self.root.untried and not self.root.children:
+            return board.get_available_moves(self.player)[0]
+
+        deadline = start + self.time_budget_ms / 1000 if self.time_budget_ms is not None else None
+        playouts = iterations = 0
+        r = self.rollouts_per_leaf
+        while (playouts < self.playouts) if deadline is None else (time.perf_counter() < deadline):
+            batch = self.leaves_per_batch * r
+            if deadline is None:  # the last batch only plays the playouts left
+                batch = min(batch, self.playouts - playouts)
+            rollouts = [min(r, batch - first) for first in range(0, batch, r)]
+            leaves = [self._select(n) for n in rollouts]
+            to_play = [(leaf, n) for leaf, n in zip(leaves, rollouts) if leaf.winner == -1]
+            for leaf, n in zip(leaves, rollouts):
+                if leaf.winner != -1:  # terminal position, no need to play it out
+                    self._backpropagate(leaf, n if leaf.winner == 0 else 0, n if leaf.winner == 1 else 0, 0)
+            if to_play:
+                counts = [n for _, n in to_play]
+                boards = np.repeat([BitboardGame.from_bits(*leaf.bits).get_board().ravel() for leaf, _ in to_play], counts, axis=0)
+                players = np.repeat([leaf.player for leaf, _ in to_play], counts)
+                winners = random_playouts(boards, players, self.rng, self.max_rollout_plies)
+                for (leaf, n), results in zip(to_play, np.split(winners, np.cumsum(counts)[:-1])):
+                    x_wins = int((results == 0).sum())
+                    o_wins = int((results == 1).sum())
+                    self._backpropagate(leaf, x_wins, o_wins, n - x_wins - o_wins)
+            playouts += batch
+            iterations += 1
+
+        # most visited move, the win rate breaks ties (with few playouts many children have a single batch)
+        best = max(self.root.children, key=lambda c: (c.visits, c.wins / c.visits))
+        self.last_search = {
+            'playouts': playouts,
+            'iterations': iterations,
+            'root_visits': self.root.visits,
+            'win_rate': best.wins / best.visits,
+            'time_ms': (time.perf_counter() - start) * 1000,
+        }
+        self.root = best
+        return best.move
+
+
+class SolvedPlayer(Player):
+    def __init__(self, player: int, table_path: str, fallback: Player = None):
+        '''
+        Plays from a 5x5 table written by solver.py: every move is a lookup of the children of the current position.
+        Layers are solved from the full board down, the table covers the endgame first; positions it does not
+        cover yet are passed to fallback. Smaller tables are read with solver.SolvedTable directly.
+        '''
+        super().__init__()
+        self.player = player
+        self.table = SolvedTable(table_path)
+        size = self.table.geometry.size
+        if size != 5:
+            raise ValueError(f'{table_path} is a {size}x{size} table, games are played on a 5x5 board')
+        self.fallback = fallback
+
+    def make_move(self, game: 'Game') -> tuple[tuple[int, int], Move]:
+        board = game.get_board().ravel()
+        cells = np.where(board == self.player, 1, np.where(board == 1 - self.player, 2, 0))
+        move = self.table.best_move(cells)
+        if move is None:
+            if self.fallback is None:
+                raise LookupError('position not solved yet and no fallback player given')
+            return self.fallback.make_move(game)
+        from_pos, slide = self.table.geometry.moves[move][:2]
+        return from_pos, slide
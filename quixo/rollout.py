@@ -0,0 +1,60 @@
+import numpy as np
+from bitboard_game import MOVE_TABLE
+from evaluation import LINES, SEGMENTS
+
+# The 44 legal (tile, slide) pairs as arrays, so a whole batch of boards can make a different move each.
+# A slide is a permutation of the cells: new_board = board[PERMUTATIONS[m]], then the pushed piece lands on DESTINATIONS[m].
+MOVES = [((col, row), slide) for (row, col), slide in MOVE_TABLE]
+TILES = np.array([row * 5 + col for (col, row), _ in MOVES])
+DESTINATIONS = np.array([SEGMENTS[move][-1] for move in MOVES])
+
+
+def _permutation(move) -> np.ndarray:
+    permutation = np.arange(25)
+    segment = SEGMENTS[move]
+    for k in range(len(segment) - 1):
+        permutation[segment[k]] = segment[k + 1]
+    return permutation
+
+
+PERMUTATIONS = np.array([_permutation(move) for move in MOVES])
+LINE_CELLS = np.array(LINES)
+
+
+def batch_winner(boards: np.ndarray) -> np.ndarray:
+    '''Game.check_winner for an (n, 25) batch: the owner of the first complete line in scan order, -1 if none'''
+    cells = boards[:, LINE_CELLS]
+    x_full = (cells == 0).all(axis=2)
+    o_full = (cells == 1).all(axis=2)
+    any_full = x_full | o_full
+    first = any_full.argmax(axis=1)
+    rows = np.arange(len(boards))
+    return np.where(any_full.any(axis=1), np.where(x_full[rows, first], 0, 1), -1)
+
+
+def random_playouts(boards: np.ndarray, players: np.ndarray, rng: np.random.Generator, max_plies: int = 200) -> np.ndarray:
+    '''
+    Plays one random game in lockstep from each of the (n, 25) boards (cells -1 / 0 / 1), players[i] moving first
+    on board i. Returns the winner of every game, -1 for games still open after max_plies.
+    '''
+    boards = np.array(boards, dtype=np.int8).reshape(-1, 25)
+    players = np.array(players, dtype=np.int8).reshape(-1)
+    winners = np.full(len(boards), -1, dtype=np.int8)
+    active = np.arange(len(boards))  # original index of the boards still being played
+    for _ in range(max_plies):
+        # uniform choice among the legal moves: the k-th legal move with k random below the number of legal moves
+        legal = np.cumsum(boards[:, TILES] != (1 - players)[:, None], axis=1)
+        k = (rng.random(len(boards)) * legal[:, -1]).astype(legal.dtype)
+        moves = (legal > k[:, None]).argmax(axis=1)
+        boards = np.take_along_axis(boards, PERMUTATIONS[moves], axis=1)
+        boards[np.arange(len(boards)), DESTINATIONS[moves]] = players
+        result = batch_winner(boards)
+        finished = result >= 0
+        if finished.any():
+            winners[active[finished]] = result[finished]
+            open_games = ~finished
+            boards, players, active = boards[open_games], players[open_games], active[open_games]
+            if len(boards) == 0:
+                break
+        players = 1 - players
+    return winners
@@ -0,0 +1,499 @@
+'''
+Retrograde analysis of Quixo, following "Quixo Is Solved" (Tanaka et al.).
+
+    python solver.py solve --size 4 --table quixo4      # can be stopped and restarted at any time
+    python solver.py stats --table quixo4
+
+Positions are always seen from the player to move: cells are 0 empty, 1 own piece, 2 opponent piece, and only
+the canonical image of a position is stored, the one with the smallest base-3 code sum(cell * 3**i) among its
+8 symmetric images. A move never removes a piece, so the positions with k pieces only depend on themselves and
+on the positions with k + 1 pieces: layers are solved from the full board down to the empty one. Inside a layer
+values are propagated pass after pass until nothing changes; the positions still unknown then are draws.
+
+The table is a directory with two .npy files per layer, opened with numpy.memmap. Geometry.rank numbers the
+positions of a layer without holes, layerKK.index.npy has one bit per rank, set for canonical positions, and
+the count of canonical positions before every 64 ranks, so layerKK.npy holds one uint16 per canonical position
+and nothing else: the low 2 bits are the value for the player to move, the others the pass of the layer that
+proved it. A position solved at pass p only relies on positions of the same layer solved before pass p, so
+following the stored passes a won game always makes progress. A layer takes about half a byte per position:
+22 MB for all of 4x4, 17 MB, 210 MB and 1.3 GB for the 5x5 layers with 25, 24 and 23 pieces and 420 GB for
+the whole 5x5 board (the paper packs values in 2 bits and needs ~200 GB).
+
+Progress is written to <table>/progress.json after every chunk, solving resumes from the last chunk written.
+Values only ever go from unknown to proven, so a chunk interrupted halfway is just solved again.
+
+A position where the move completes lines of both players is lost by the player who moved, as in the paper;
+Game.check_winner would give it to the owner of the first line in scan order, which is not symmetric.
+'''
+import argparse
+import json
+import os
+import time
+from math import factorial
+import numpy as np
+from game import Move
+
+UNKNOWN = 0
+WIN = 1
+LOSS = 2
+DRAW = 3
+MAX_PASS = (1 << 14) - 1
+
+# own and opponent pieces swap when the turn passes
+SWAP = np.array([0, 2, 1], dtype=np.int8)
+
+
+def _slides(row: int, col: int, size: int) -> list:
+    '''Same rule as enhanced_game._acceptable_slides for a board of any size'''
+    slides = [Move.BOTTOM, Move.TOP, Move.LEFT, Move.RIGHT]
+    if row == 0:
+        slides.remove(Move.TOP)
+    elif row == size - 1:
+        slides.remove(Move.BOTTOM)
+    if col == 0:
+        slides.remove(Move.LEFT)
+    elif col == size - 1:
+        slides.remove(Move.RIGHT)
+    return slides
+
+
+def _segment(row: int, col: int, slide: Move, size: int) -> list:
+    '''Cells from the taken tile to the cell where it is pushed back in'''
+    if slide == Move.TOP:
+        return [r * size + col for r in range(row, -1, -1)]
+    if slide == Move.BOTTOM:
+        return [r * size + col for r in range(row, size)]
+    if slide == Move.LEFT:
+        return [row * size + c for c in range(col, -1, -1)]
+    return [row * size + c for c in range(col, size)]
+
+
+class Geometry:
+    '''Move, line, symmetry and ranking tables of a size x size board'''
+
+    def __init__(self, size: int):
+        if not 2 <= size <= 5:
+            raise ValueError('size must be between 2 and 5')
+        self.size = size
+        n = self.cells = size * size
+        grid = np.arange(n).reshape(size, size)
+
+        # moves as (tile, permutation, destination): child = cells[:, permutation], child[:, destination] = 1
+        self.moves = []
+        for row in range(size):
+            for col in range(size):
+                if row not in (0, size - 1) and col not in (0, size - 1):
+                    continue
+                for slide in _slides(row, col, size):
+                    segment = _segment(row, col, slide, size)
+                    permutation = np.arange(n)
+                    for k in range(len(segment) - 1):
+                        permutation[segment[k]] = segment[k + 1]
+                    self.moves.append(((col, row), slide, row * size + col, permutation, segment[-1]))
+
+        self.lines = np.array(
+            [grid[r] for r in range(size)] + [grid[:, c] for c in range(size)]
+            + [grid.diagonal(), np.fliplr(grid).diagonal()]
+        )
+        images = []
+        for flipped in (grid, grid.T):
+            for k in range(4):
+                images.append(np.rot90(flipped, k).ravel())
+        self.symmetries = np.array(images)
+        powers = 3 ** np.arange(n, dtype=np.int64)
+        # codes of the 8 images of a board in one product: (cells @ symmetry_powers)[:, s] = code(cells[:, symmetries[s]])
+        self.symmetry_powers = np.stack([powers[np.argsort(sym)] for sym in self.symmetries], axis=1)
+
+        # counts[m, a, b]: boards of m cells with a own and b opponent pieces. Index -1 (= n + 1) is all zeros,
+        # so that counts[m, a - 1, b] is 0 when a is 0.
+        self.counts = np.zeros((n + 1, n + 2, n + 2), dtype=np.int64)
+        for m in range(n + 1):
+            for a in range(m + 1):
+                for b in range(m - a + 1):
+                    self.counts[m, a, b] = factorial(m) // (factorial(a) * factorial(b) * factorial(m - a - b))
+        # offsets[k, a]: rank of the first position with a own pieces among the positions with k pieces,
+        # offsets[k, k + 1] is the size of the layer
+        self.offsets = np.zeros((n + 1, n + 2), dtype=np.int64)
+        for k in range(n + 1):
+            self.offsets[k, 1:k + 2] = np.cumsum([self.counts[n, a, k - a] for a in range(k + 1)])
+
+    def layer_size(self, pieces: int) -> int:
+        return int(self.offsets[pieces, pieces + 1])
+
+    def rank(self, cells: np.ndarray) -> np.ndarray:
+        '''Ranks of boards in their layer: class by class (own pieces), lexicographic inside a class'''
+        a = (cells == 1).sum(axis=1)
+        b = (cells == 2).sum(axis=1)
+        ranks = self.offsets[a + b, a]
+        # counts[m] and counts[m, a - 1] read at the flat index a * (n + 2) + b of the pieces left
+        empty = self.counts.reshape(self.cells + 1, -1)
+        mine = np.roll(self.counts, 1, axis=1).reshape(self.cells + 1, -1)
+        stride = self.cells + 2
+        left = a * stride + b
+        for i in range(self.cells):
+            m = self.cells - i - 1
+            cell = cells[:, i]
+            ranks += np.where(cell >= 1, empty[m].take(left), 0) + np.where(cell == 2, mine[m].take(left), 0)
+            left -= np.where(cell == 1, stride, cell == 2)
+        return ranks
+
+    def unrank(self, ranks: np.ndarray, pieces: int) -> np.ndarray:
+        '''Boards with {pieces} pieces at the given ranks, inverse of rank'''
+        ranks = np.array(ranks, dtype=np.int64)
+        offsets = self.offsets[pieces, :pieces + 1]
+        a = np.searchsorted(offsets, ranks, side='right') - 1
+        b = pieces - a
+        ranks -= offsets[a]
+        cells = np.zeros((len(ranks), self.cells), dtype=np.int8)
+        for i in range(self.cells):
+            m = self.cells - i - 1
+            empty = self.counts[m, a, b]
+            mine = self.counts[m, a - 1, b]
+            cell = np.where(ranks < empty, 0, np.where(ranks < empty + mine, 1, 2))
+            ranks -= np.where(cell >= 1, empty, 0) + np.where(cell == 2, mine, 0)
+            a -= cell == 1
+            b -= cell == 2
+            cells[:, i] = cell
+        return cells
+
+    def codes(self, cells: np.ndarray) -> np.ndarray:
+        '''(n, 8) base-3 codes of the symmetric images, column 0 is the board itself'''
+        return cells.astype(np.int64) @ self.symmetry_powers
+
+    def is_canonical(self, cells: np.ndarray) -> np.ndarray:
+        codes = self.codes(cells)
+        return codes[:, 0] == codes.min(axis=1)
+
+    def canonical(self, cells: np.ndarray) -> np.ndarray:
+        '''Symmetric image of every board with the smallest code'''
+        image = self.codes(cells).argmin(axis=1)
+        return np.take_along_axis(cells, self.symmetries[image], axis=1)
+
+    def has_line(self, cells: np.ndarray, piece: int) -> np.ndarray:
+        return (cells[:, self.lines] == piece).all(axis=2).any(axis=1)
+
+    def terminal(self, cells: np.ndarray) -> np.ndarray:
+        '''WIN / LOSS for the player to move when the game is over, UNKNOWN otherwise'''
+        # the opponent just moved: a line of ours means the opponent completed it and lost
+        return np.where(self.has_line(cells, 1), WIN, np.where(self.has_line(cells, 2), LOSS, UNKNOWN))
+
+    def child(self, cells: np.ndarray, move: int) -> np.ndarray:
+        '''Boards after {move}, seen from the opponent who is now to move'''
+        _, _, _, permutation, destination = self.moves[move]
+        child = cells[:, permutation]
+        child[:, destination] = 1
+        return SWAP[child]
+
+
+# set bits of every byte value
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    '''Set bits of every uint64'''
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    return _POPCOUNT[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1, dtype=np.int64)
+
+
+def table_size(path: str) -> int:
+    '''Board size of the table directory of a solver run'''
+    progress_path = os.path.join(path, 'progress.json')
+    if not os.path.exists(progress_path):
+        raise ValueError(f'{path} is not a solver table')
+    with open(progress_path) as f:
+        return json.load(f)['size']
+
+
+class Layer:
+    '''
+    Values of the canonical positions with {pieces} pieces, memory mapped.
+    index[w, 0] has bit i set when the position of rank 64 * w + i is canonical, index[w, 1] counts the canonical
+    positions of rank below 64 * w, so a canonical position is stored at values[index[w, 1] + set bits below i].
+    '''
+
+    def __init__(self, path: str, pieces: int, mode: str = 'r'):
+        self.pieces = pieces
+        self.index = np.load(Layer.index_path(path, pieces), mmap_mode=mode)
+        self.values = np.load(Layer.values_path(path, pieces), mmap_mode=mode)
+
+    @staticmethod
+    def index_path(path: str, pieces: int) -> str:
+        return os.path.join(path, f'layer{pieces:02d}.index.npy')
+
+    @staticmethod
+    def values_path(path: str, pieces: int) -> str:
+        return os.path.join(path, f'layer{pieces:02d}.npy')
+
+    def locate(self, ranks: np.ndarray) -> np.ndarray:
+        '''Positions in values of the canonical positions of the given ranks'''
+        words = ranks >> 6
+        below = self.index[words, 0] & ((np.uint64(1) << (ranks & 63).astype(np.uint64)) - np.uint64(1))
+        return self.index[words, 1].astype(np.int64) + popcount(below)
+
+
+class Table:
+    '''The layers of a table directory, opened when first needed'''
+
+    def __init__(self, path: str, size: int, mode: str = 'r'):
+        self.geometry = Geometry(size)
+        self.path = path
+        self.mode = mode
+        self.layers = {}
+
+    def layer(self, pieces: int):
+        '''The Layer with {pieces} pieces, None while the solver has not reached it'''
+        if pieces not in self.layers:
+            if not os.path.exists(Layer.values_path(self.path, pieces)):
+                return None
+            self.layers[pieces] = Layer(self.path, pieces, self.mode)
+        return self.layers[pieces]
+
+    def entries(self, cells: np.ndarray) -> np.ndarray:
+        '''Table entries of boards of any layer, UNKNOWN in the layers not reached yet'''
+        g = self.geometry
+        cells = g.canonical(cells)
+        pieces = (cells != 0).sum(axis=1)
+        ranks = g.rank(cells)
+        entries = np.zeros(len(cells), dtype=np.uint16)
+        for k in np.unique(pieces):
+            layer = self.layer(int(k))
+            if layer is not None:
+                found = pieces == k
+                entries[found] = layer.values[layer.locate(ranks[found])]
+        return entries
+
+
+# pass of a layer that builds its index, before the values file exists
+INDEXING = -1
+
+
+class RetrogradeSolver:
+    '''
+    size: side of the board
+    path: directory of the table, created if missing, progress is kept in path/progress.json
+    chunk: positions generated at once (rounded up to a multiple of 64), the memory used is a few hundred
+           bytes per position
+    '''
+
+    def __init__(self, size: int, path: str, chunk: int = 1 << 18):
+        self.geometry = Geometry(size)
+        self.path = path
+        self.chunk = -(-chunk // 64) * 64
+        os.makedirs(path, exist_ok=True)
+        self.table = Table(path, size, 'r+')
+        self.progress_path = os.path.join(path, 'progress.json')
+        if os.path.exists(self.progress_path):
+            with open(self.progress_path) as f:
+                self.progress = json.load(f)
+            if self.progress['size'] != size:
+                raise ValueError(f'{path} holds a {self.progress["size"]}x{self.progress["size"]} table')
+        else:
+            # next chunk to solve: layer, pass of the layer (INDEXING, then 1, 2, ... and 0 = marking draws),
+            # rank of its first position
+            self.progress = {'size': size, 'layer': self.geometry.cells, 'pass': INDEXING, 'position': 0,
+                             'changed': False, 'done': False, 'seconds': 0.0}
+            self._save()
+
+    def _save(self) -> None:
+        for layer in self.table.layers.values():
+            layer.index.flush()
+            layer.values.flush()
+        tmp = self.progress_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.progress, f)
+        os.replace(tmp, self.progress_path)
+
+    def _chunks(self, layer: int):
+        '''Yields (first rank, next rank, boards) of the positions of a layer, from the saved progress on'''
+        total = self.geometry.layer_size(layer)
+        for first in range(self.progress['position'], total, self.chunk):
+            ranks = np.arange(first, min(first + self.chunk, total))
+            yield first, first + len(ranks), self.geometry.unrank(ranks, layer)
+
+    def _index_chunk(self, index: np.ndarray, first: int, cells: np.ndarray) -> None:
+        bits = np.packbits(self.geometry.is_canonical(cells), bitorder='little')
+        words = np.zeros(-(-len(bits) // 8) * 8, dtype=np.uint8)
+        words[:len(bits)] = bits
+        words = words.view(np.uint64)
+        index[first // 64:first // 64 + len(words), 0] = words
+
+    def _create_values(self, layer: int, index: np.ndarray) -> None:
+        '''Counts the canonical positions before every word of the index, then creates the values file'''
+        total = 0
+        for first in range(0, len(index), 1 << 20):
+            counts = popcount(index[first:first + (1 << 20), 0])
+            index[first:first + len(counts), 1] = total + np.cumsum(counts) - counts
+            total += int(counts.sum())
+        index.flush()
+        values = np.lib.format.open_memmap(Layer.values_path(self.path, layer), mode='w+', dtype=np.uint16,
+                                           shape=(total,))
+        values.flush()
+
+    def _solve_chunk(self, layer: Layer, first: int, cells: np.ndarray, current_pass: int) -> bool:
+        g = self.geometry
+        values = layer.values
+        cells = cells[g.is_canonical(cells)]
+        # canonical positions of consecutive ranks are stored next to each other
+        positions = layer.locate(np.array([first])) + np.arange(len(cells))
+        open_positions = values[positions] & 3 == UNKNOWN
+        cells, positions = cells[open_positions], positions[open_positions]
+        if len(positions) == 0:
+            return False
+        if current_pass == 0:  # the layer converged: what is left can never be forced, it is a draw
+            values[positions] = DRAW
+            return True
+
+        over = g.terminal(cells)
+        changed = bool(over.any())
+        values[positions[over != UNKNOWN]] = over[over != UNKNOWN]  # pass 0, game already over
+        cells, positions = cells[over == UNKNOWN], positions[over == UNKNOWN]
+
+        any_loss = np.zeros(len(positions), dtype=bool)
+        all_win = np.ones(len(positions), dtype=bool)
+        for move, (_, _, tile, _, _) in enumerate(g.moves):
+            legal = cells[:, tile] != 2
+            children = g.child(cells, move)
+            entries = self.table.entries(children)
+            # taking an own piece stays in the layer: only the results of the previous passes count,
+            # finished games are recognised directly so the passes do not depend on the chunk order
+            same_layer = cells[:, tile] == 1
+            results = np.where(same_layer & (entries >> 2 >= current_pass), UNKNOWN, entries & 3)
+            over = np.where(same_layer, g.terminal(children), UNKNOWN)
+            results = np.where(over != UNKNOWN, over, results)
+            any_loss |= legal & (results == LOSS)
+            all_win &= ~legal | (results == WIN)
+
+        stamp = np.uint16(current_pass << 2)
+        values[positions[any_loss]] = stamp | WIN
+        values[positions[all_win & ~any_loss]] = stamp | LOSS
+        return changed or bool(any_loss.any() or all_win.any())
+
+    def solve(self, max_seconds: float = None, verbose: bool = True) -> bool:
+        '''Solves until done or until max_seconds have passed, returns True when the whole table is solved'''
+        g = self.geometry
+        progress = self.progress
+        start = time.perf_counter()
+        elapsed = progress['seconds']
+        while not progress['done']:
+            layer, current_pass = progress['layer'], progress['pass']
+            if current_pass == INDEXING:
+                index_path = Layer.index_path(self.path, layer)
+                if os.path.exists(index_path):
+                    index = np.load(index_path, mmap_mode='r+')
+                else:
+                    index = np.lib.format.open_memmap(index_path, mode='w+', dtype=np.uint64,
+                                                      shape=(-(-g.layer_size(layer) // 64), 2))
+            for first, next_rank, cells in self._chunks(layer):
+                if current_pass == INDEXING:
+                    self._index_chunk(index, first, cells)
+                    index.flush()
+                else:
+                    progress['changed'] |= self._solve_chunk(self.table.layer(layer), first, cells, current_pass)
+                progress['position'] = next_rank
+                progress['seconds'] = elapsed + time.perf_counter() - start
+                self._save()
+                if max_seconds is not None and time.perf_counter() - start > max_seconds:
+                    return False
+            if current_pass == INDEXING:
+                self._create_values(layer, index)
+                del index
+            elif verbose:
+                print(f"layer {layer:2d} pass {current_pass:3d}: {'changed' if progress['changed'] else 'stable'}"
+                      f"  ({progress['seconds']:.0f}s)", flush=True)
+            if current_pass == INDEXING:
+                progress['pass'] = 1
+            elif current_pass == 0:
+                progress.update(layer=layer - 1, done=layer == 0)
+                progress['pass'] = INDEXING
+            elif progress['changed']:
+                if current_pass == MAX_PASS:
+                    raise RuntimeError(f'layer {layer} did not converge in {MAX_PASS} passes')
+                progress['pass'] = current_pass + 1
+            else:
+                progress['pass'] = 0
+            progress.update({'position': 0, 'changed': False})
+            self._save()
+        return True
+
+
+class SolvedTable:
+    '''Read only access to a solved table: value lookups and best moves, the layers solved so far can be used'''
+
+    def __init__(self, path: str):
+        self.table = Table(path, table_size(path))
+        self.geometry = self.table.geometry
+
+    def entry(self, cells: np.ndarray) -> tuple[int, int]:
+        '''(value, pass) of a position seen from the player to move'''
+        entry = int(self.table.entries(np.asarray(cells, dtype=np.int8).reshape(1, -1))[0])
+        return entry & 3, entry >> 2
+
+    def best_move(self, cells: np.ndarray):
+        '''
+        Index in Geometry.moves of the best move, or None when the position is not in the table.
+        Wins go for an immediate win, then for a move adding a piece, then for the child proved earliest;
+        losses resist as long as possible.
+        '''
+        g = self.geometry
+        cells = np.asarray(cells, dtype=np.int8).reshape(1, -1)
+        legal = [m for m, move in enumerate(g.moves) if cells[0, move[2]] != 2]
+        children = np.concatenate([g.child(cells, m) for m in legal])
+        entries = self.table.entries(children)
+        values, passes = entries & 3, entries >> 2
+        if (values == UNKNOWN).any():
+            return None
+        same_layer = np.array([cells[0, g.moves[m][2]] == 1 for m in legal])
+        if (values == LOSS).any():
+            keys = [(p != 0, same, p) if v == LOSS else (True, True, MAX_PASS + 1)
+                    for v, p, same in zip(values, passes, same_layer)]
+            return legal[min(range(len(legal)), key=keys.__getitem__)]
+        if (values == DRAW).any():
+            return legal[int(np.argmax(values == DRAW))]
+        return legal[int(np.argmax(passes))]
+
+
+def stats(path: str) -> dict:
+    table = SolvedTable(path).table
+    g = table.geometry
+    counts = np.zeros(4, dtype=np.int64)
+    layers = []
+    for k in range(g.cells + 1):
+        layer = table.layer(k)
+        if layer is None:
+            continue
+        layers.append(k)
+        for first in range(0, len(layer.values), 1 << 24):
+            entries = np.asarray(layer.values[first:first + (1 << 24)])
+            counts += np.bincount(entries[entries != 0] & 3, minlength=4)
+    empty = np.zeros((1, g.cells), dtype=np.int8)
+    return {
+        'size': g.size,
+        'layers': layers,
+        'wins': int(counts[WIN]),
+        'losses': int(counts[LOSS]),
+        'draws': int(counts[DRAW]),
+        'empty_board': ('unknown', 'win', 'loss', 'draw')[int(table.entries(empty)[0]) & 3],
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    solve = sub.add_parser('solve', help='solve, or resume solving, a table')
+    solve.add_argument('--size', type=int, default=5)
+    solve.add_argument('--table', required=True)
+    solve.add_argument('--chunk', type=int, default=1 << 18)
+    solve.add_argument('--max-seconds', type=float, default=None, help='stop (resumable) after this many seconds')
+    show = sub.add_parser('stats', help='count the solved positions')
+    show.add_argument('--table', required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'solve':
+        done = RetrogradeSolver(args.size, args.table, args.chunk).solve(args.max_seconds)
+        print('solved' if done else 'stopped, run again to resume')
+    else:
+        print(json.dumps(stats(args.table)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+'''
+Parallel tournament runner: plays every pairing over a process pool and streams one JSON line per game,
+followed by one summary line per pairing.
+
+    python tournament.py --pairing minmax:depth=3 noob --pairing minmax:depth=2 random -n 100 --out results.jsonl
+    python tournament.py --round-robin random noob minmax:depth=1 minmax:depth=2,backend=bitboard -n 50
+
+Player specs are name[:key=value,...]:
+    random
+    noob[:backend=enhanced|bitboard]
+    minmax:depth=2[,backend=bitboard][,tt=65536][,time_ms=200][,workers=4]
+    mcts[:playouts=20000][,time_ms=300]
+
+Sides alternate: in even games the first player of the pairing moves first. Every game gets its own seed
+derived from --seed, the pairing and the game index, so a run can be reproduced game by game. A game still
+running after --max-plies moves is recorded as a draw (deterministic players can repeat positions forever),
+win rates count a draw as half a win.
+'''
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+import numpy as np
+from game import Game, Player
+from players import RandomPlayer, NoobPlayer, MinMaxFragger, MCTSPlayer
+from enhanced_game import EnhancedGame
+from bitboard_game import BitboardGame
+
+BACKENDS = {'enhanced': EnhancedGame, 'bitboard': BitboardGame}
+
+
+def parse_spec(spec: str) -> tuple[str, dict]:
+    name, _, options = spec.partition(':')
+    kwargs = {}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        kwargs[key] = value
+    if name not in ('random', 'noob', 'minmax', 'mcts'):
+        raise ValueError(f'unknown player {name!r} in {spec!r}')
+    return name, kwargs
+
+
+def make_player(spec: str, player_id: int, seed: int = None) -> Player:
+    name, kwargs = parse_spec(spec)
+    backend = BACKENDS[kwargs.get('backend', 'enhanced')]
+    if name == 'random':
+        return RandomPlayer()
+    if name == 'noob':
+        return NoobPlayer(player_id, backend=backend)
+    if name == 'mcts':
+        return MCTSPlayer(
+            player_id,
+            playouts=int(kwargs.get('playouts', 20000)),
+            time_budget_ms=float(kwargs['time_ms']) if 'time_ms' in kwargs else None,
+            seed=seed,
+        )
+    return MinMaxFragger(
+        player_id,
+        depth=int(kwargs['depth']) if 'depth' in kwargs else None,
+        backend=backend,
+        tt_size=int(kwargs.get('tt', 0)),
+        time_budget_ms=float(kwargs['time_ms']) if 'time_ms' in kwargs else None,
+        workers=int(kwargs.get('workers', 1)),
+    )
+
+
+class TimedPlayer(Player):
+    '''Wraps a player to record the latency of every move (retries of a rejected move included) and the number of moves played'''
+
+    def __init__(self, player: Player, player_id: int, log: dict) -> None:
+        super().__init__()
+        self.player = player
+        self.player_id = player_id
+        self.log = log
+        self.latencies = []
+        self.moves = 0
+
+    def make_move(self, game: 'Game'):
+        start = time.perf_counter()
+        move = self.player.make_move(game)
+        latency = (time.perf_counter() - start) * 1000
+        # Game.play asks the same player again when its move is not acceptable, that is not a new move
+        if self.log.get('last') != self.player_id:
+            self.moves += 1
+            self.log['last'] = self.player_id
+            self.latencies.append(latency)
+        else:
+            self.latencies[-1] += latency
+        return move
+
+
+def game_seed(base_seed: int, pairing: int, game: int) -> int:
+    return (base_seed * 1_000_003 + pairing * 10_007 + game) % 2**32
+
+
+def play_game(task: dict) -> dict:
+    '''Runs in a worker process: plays one game and returns its record'''
+    random.seed(task['seed'])
+    np.random.seed(task['seed'])
+    a_first = task['game'] % 2 == 0
+    specs = (task['a'], task['b']) if a_first else (task['b'], task['a'])
+    log = {}
+    # players with their own generator (MCTS) get a seed per side derived from the game seed
+    timed = [TimedPlayer(make_player(spec, i, task['seed'] * 2 + i), i, log) for i, spec in enumerate(specs)]
+    start = time.perf_counter()
+    try:
+        winner = Game().play(timed[0], timed[1], task.get('max_plies'))
+    finally:
+        for t in timed:
+            if hasattr(t.player, 'close'):
+                t.player.close()
+    elapsed = time.perf_counter() - start
+    a, b = (timed[0], timed[1]) if a_first else (timed[1], timed[0])
+    a_id = 0 if a_first else 1
+    return {
+        'type': 'game',
+        'pairing': task['pairing'],
+        'game': task['game'],
+        'seed': task['seed'],
+        'a': task['a'],
+        'b': task['b'],
+        'a_first': a_first,
+        'winner': 'draw' if int(winner) < 0 else 'a' if int(winner) == a_id else 'b',
+        'moves': a.moves + b.moves,
+        'seconds': elapsed,
+        'a_latency_ms': a.latencies,
+        'b_latency_ms': b.latencies,
+    }
+
+
+def wilson_interval(wins: float, n: int, z: float = 1.96) -> tuple[float, float]:
+    '''95% Wilson score interval of a win rate, wins may count draws as halves'''
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def _latency(values: list) -> dict:
+    if not values:
+        return {'mean_ms': None, 'p95_ms': None}
+    return {'mean_ms': float(np.mean(values)), 'p95_ms': float(np.percentile(values, 95))}
+
+
+def summarize(records: list) -> dict:
+    first = records[0]
+    wins = sum(r['winner'] == 'a' for r in records)
+    draws = sum(r['winner'] == 'draw' for r in records)
+    score = wins + draws / 2
+    low, high = wilson_interval(score, len(records))
+    return {
+        'type': 'summary',
+        'pairing': first['pairing'],
+        'a': first['a'],
+        'b': first['b'],
+        'games': len(records),
+        'a_wins': wins,
+        'b_wins': len(records) - wins - draws,
+        'draws': draws,
+        'a_win_rate': score / len(records),
+        'a_win_rate_ci95': [low, high],
+        'a_win_rate_first': _rate([r for r in records if r['a_first']]),
+        'a_win_rate_second': _rate([r for r in records if not r['a_first']]),
+        'mean_moves': float(np.mean([r['moves'] for r in records])),
+        'a_latency': _latency([v for r in records for v in r['a_latency_ms']]),
+        'b_latency': _latency([v for r in records for v in r['b_latency_ms']]),
+        'seconds': sum(r['seconds'] for r in records),
+    }
+
+
+def _rate(records: list):
+    if not records:
+        return None
+    return sum(1.0 if r['winner'] == 'a' else 0.5 if r['winner'] == 'draw' else 0.0 for r in records) / len(records)
+
+
+def run_tournament(pairings: list, n_games: int, seed: int = 0, workers: int = None, out=None, max_plies: int = 200) -> list:
+    '''Plays n_games for every (spec a, spec b) pairing, writes JSON lines to out, returns the summaries'''
+    for a, b in pairings:
+        parse_spec(a), parse_spec(b)  # fail before starting the pool
+    tasks = [
+        {'pairing': p, 'game': g, 'seed': game_seed(seed, p, g), 'a': a, 'b': b, 'max_plies': max_plies}
+        for p, (a, b) in enumerate(pairings) for g in range(n_games)
+    ]
+    results = {p: [] for p in range(len(pairings))}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(play_game, task) for task in tasks]
+        for future in as_completed(futures):
+            record = future.result()
+            results[record['pairing']].append(record)
+            if out is not None:
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+    summaries = []
+    for p in range(len(pairings)):
+        records = sorted(results[p], key=lambda r: r['game'])
+        summary = summarize(records)
+        summaries.append(summary)
+        if out is not None:
+            out.write(json.dumps(summary) + '\n')
+    return summaries
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairing', nargs=2, action='append', default=[], metavar=('A', 'B'))
+    parser.add_argument('--round-robin', nargs='+', default=[], metavar='SPEC')
+    parser.add_argument('-n', '--games', type=int, default=100, help='games per pairing')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, all cores by default')
+    parser.add_argument('--out', default=None, help='JSONL output file, stdout by default')
+    parser.add_argument('--max-plies', type=int, default=200, help='moves after which a game is a draw')
+    args = parser.parse_args(argv)
+
+    pairings = [tuple(p) for p in args.pairing] + list(combinations(args.round_robin, 2))
+    if not pairings:
+        parser.error('give at least one --pairing or two --round-robin players')
+
+    out = open(args.out, 'w') if args.out else sys.stdout
+    try:
+        summaries = run_tournament(pairings, args.games, args.seed, args.workers, out, args.max_plies)
+    finally:
+        if args.out:
+            out.close()
+    for s in summaries:
+        low, high = s['a_win_rate_ci95']
+        print(f"{s['a']} vs {s['b']}: {s['a_wins']}/{s['games']}, {s['draws']} draws ({s['a_win_rate']:.1%}, 95% CI {low:.1%}-{high:.1%}), "
+              f"{s['mean_moves']:.1f} moves/game, p95 latency {s['a_latency']['p95_ms']:.1f} / {s['b_latency']['p95_ms']:.1f} ms",
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
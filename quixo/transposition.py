@@ -0,0 +1,180 @@
+import random
+import numpy as np
+from game import Move
+from enhanced_game import ALL_SYMMETRIES
+
+# Bound types stored with each entry
+EXACT = 0
+LOWER = 1  # the stored value is a lower bound (fail high)
+UPPER = 2  # the stored value is an upper bound (fail low)
+
+REPLACE_DEPTH = 'depth'    # keep the entry searched deeper
+REPLACE_ALWAYS = 'always'  # the newest entry always wins
+
+IDENTITY = np.arange(25)
+# identity first, so a position that is already canonical keeps its own orientation
+SYMMETRIES = [IDENTITY] + ALL_SYMMETRIES
+INVERSE_SYMMETRIES = [np.argsort(sym) for sym in SYMMETRIES]
+
+
+def _zobrist_tables(seed: int):
+    '''
+    Random 64 bit numbers for every (player, cell), then for every symmetry and every 5-bit row
+    of a bitboard the XOR of the numbers of the cells the row bits land on after the symmetry.
+    '''
+    rng = random.Random(seed)
+    zobrist = [[rng.getrandbits(64) for _ in range(25)] for _ in range(2)]
+    side = rng.getrandbits(64)
+    tables = []
+    for inverse in INVERSE_SYMMETRIES:
+        per_player = []
+        for player in (0, 1):
+            rows = []
+            for r in range(5):
+                row = []
+                for value in range(32):
+                    key = 0
+                    for k in range(5):
+                        if value >> k & 1:
+                            key ^= zobrist[player][int(inverse[r * 5 + k])]
+                    row.append(key)
+                rows.append(row)
+            per_player.append(rows)
+        tables.append(per_player)
+    return tables, side
+
+
+ZOBRIST_TABLES, ZOBRIST_SIDE = _zobrist_tables(seed=317264)
+
+
+def zobrist_key(x_bits: int, o_bits: int, player: int, sym: int = 0) -> int:
+    '''Zobrist hash of the position after applying SYMMETRIES[sym]'''
+    x_table, o_table = ZOBRIST_TABLES[sym]
+    key = ZOBRIST_SIDE if player == 1 else 0
+    for r in range(5):
+        key ^= x_table[r][x_bits >> (5 * r) & 31] ^ o_table[r][o_bits >> (5 * r) & 31]
+    return key
+
+
+def canonical_key(x_bits: int, o_bits: int, player: int) -> tuple[int, int]:
+    '''Returns the smallest Zobrist key among the 8 symmetric images of the board and the symmetry that produced it'''
+    best_key, best_sym = zobrist_key(x_bits, o_bits, player), 0
+    for sym in range(1, len(SYMMETRIES)):
+        key = zobrist_key(x_bits, o_bits, player, sym)
+        if key < best_key:
+            best_key, best_sym = key, sym
+    return best_key, best_sym
+
+
+def _slide_towards(tile: int, dest: int) -> Move:
+    if dest // 5 == tile // 5:
+        return Move.LEFT if dest % 5 == 0 else Move.RIGHT
+    return Move.TOP if dest // 5 == 0 else Move.BOTTOM
+
+
+def _destination(tile: int, slide: Move) -> int:
+    row, col = divmod(tile, 5)
+    if slide == Move.TOP:
+        return col
+    if slide == Move.BOTTOM:
+        return 20 + col
+    if slide == Move.LEFT:
+        return row * 5
+    return row * 5 + 4
+
+
+def move_to_canonical(move: tuple[tuple[int, int], Move], sym: int) -> tuple[int, int]:
+    '''Encodes a move as (tile index, destination index) in the frame of the canonical board'''
+    (col, row), slide = move
+    tile = row * 5 + col
+    inverse = INVERSE_SYMMETRIES[sym]
+    return int(inverse[tile]), int(inverse[_destination(tile, slide)])
+
+
+def move_from_canonical(canonical_move: tuple[int, int], sym: int) -> tuple[tuple[int, int], Move]:
+    '''Inverse of move_to_canonical, returns the move in the (X, Y) format used by Game'''
+    symmetry = SYMMETRIES[sym]
+    tile = int(symmetry[canonical_move[0]])
+    dest = int(symmetry[canonical_move[1]])
+    return (tile % 5, tile // 5), _slide_towards(tile, dest)
+
+
+class TranspositionTable:
+    '''
+    Bounded transposition table indexed by the canonical (symmetry reduced) Zobrist key of a position.
+    Each slot stores key, value, bound type, depth and best move; the best move is kept in the
+    canonical frame and mapped back to the orientation of the probing position.
+
+    size: number of slots
+    policy: 'depth' keeps the deeper entry on a slot conflict, 'always' overwrites it
+    use_symmetries: when False the plain Zobrist key is used, i.e. no symmetry reduction.
+        Note that MinMaxFragger.evaluate is not invariant under rotations and reflections,
+        so with symmetries enabled non terminal values of a mirrored position are approximations.
+    '''
+
+    def __init__(self, size: int = 1 << 16, policy: str = REPLACE_DEPTH, use_symmetries: bool = True):
+        if size <= 0:
+            raise ValueError('size must be positive')
+        if policy not in (REPLACE_DEPTH, REPLACE_ALWAYS):
+            raise ValueError(f'unknown replacement policy {policy!r}')
+        self.size = size
+        self.policy = policy
+        self.use_symmetries = use_symmetries
+        self.clear()
+
+    def clear(self) -> None:
+        self._keys = [None] * self.size
+        self._values = [0.0] * self.size
+        self._depths = [-1] * self.size
+        self._flags = [EXACT] * self.size
+        self._moves = [None] * self.size
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.rejected = 0
+
+    def key(self, x_bits: int, o_bits: int, player: int) -> tuple[int, int]:
+        if self.use_symmetries:
+            return canonical_key(x_bits, o_bits, player)
+        return zobrist_key(x_bits, o_bits, player), 0
+
+    def probe(self, key: int, sym: int):
+        '''Returns (value, flag, depth, best_move) or None, best_move is already mapped back through sym'''
+        slot = key % self.size
+        stored = self._keys[slot]
+        if stored != key:
+            self.misses += 1
+            if stored is not None:
+                self.collisions += 1
+            return None
+        self.hits += 1
+        move = self._moves[slot]
+        if move is not None:
+            move = move_from_canonical(move, sym)
+        return self._values[slot], self._flags[slot], self._depths[slot], move
+
+    def store(self, key: int, sym: int, value: float, flag: int, depth: int, best_move) -> None:
+        slot = key % self.size
+        stored = self._keys[slot]
+        if (self.policy == REPLACE_DEPTH and stored is not None and stored != key
+                and self._depths[slot] > depth):
+            self.rejected += 1
+            return
+        self._keys[slot] = key
+        self._values[slot] = value
+        self._flags[slot] = flag
+        self._depths[slot] = depth
+        self._moves[slot] = None if best_move is None else move_to_canonical(best_move, sym)
+        self.stores += 1
+
+    def stats(self) -> dict:
+        used = sum(1 for k in self._keys if k is not None)
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'rejected': self.rejected,
+            'fill': used / self.size,
+        }